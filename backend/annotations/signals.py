@@ -0,0 +1,20 @@
+"""
+Signal handlers for the Annotations application.
+
+Drops the cached set of annotation source names used by the SQS job tasks
+whenever a source is added, renamed or removed.
+"""
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import AnnotationSource
+
+ANNOTATION_SOURCE_NAMES_CACHE_KEY = 'annotations:source_names'
+
+
+@receiver([post_save, post_delete], sender=AnnotationSource)
+def invalidate_annotation_source_names(sender, **kwargs):
+    """Forget the cached source names so the next lookup re-reads them."""
+    cache.delete(ANNOTATION_SOURCE_NAMES_CACHE_KEY)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GalaxyIntegrationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'galaxy_integration'
+
+    def ready(self):
+        from . import signals  # noqa: F401
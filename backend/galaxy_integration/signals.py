@@ -0,0 +1,20 @@
+"""
+Signal handlers for the Galaxy integration application.
+
+Drops the cached set of Galaxy instance ids used by the SQS job tasks
+whenever an instance is added or removed.
+"""
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import GalaxyInstance
+
+GALAXY_INSTANCE_IDS_CACHE_KEY = 'galaxy:instance_ids'
+
+
+@receiver([post_save, post_delete], sender=GalaxyInstance)
+def invalidate_galaxy_instance_ids(sender, **kwargs):
+    """Forget the cached instance ids so the next lookup re-reads them."""
+    cache.delete(GALAXY_INSTANCE_IDS_CACHE_KEY)
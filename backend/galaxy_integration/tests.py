@@ -1,3 +1,44 @@
+from unittest import mock
+
 from django.test import TestCase
 
-# Create your tests here.
+from variants_project.tasks import handle_sync_jobs
+from .models import GalaxyInstance, GalaxySyncJob
+
+
+class HandleSyncJobsTests(TestCase):
+    """Galaxy sync jobs received from SQS"""
+
+    def setUp(self):
+        self.instance = GalaxyInstance.objects.create(
+            name='main', url='https://galaxy.example.org', api_key='key'
+        )
+        patcher = mock.patch('variants_project.tasks.sqs_handler.acknowledge_jobs')
+        self.acknowledge_jobs = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _job(self, galaxy_instance_id, receipt_handle='r1'):
+        return {
+            'body': {'galaxy_instance_id': galaxy_instance_id, 'sync_type': 'history', 'items': [1, 2]},
+            'receipt_handle': receipt_handle,
+        }
+
+    def test_string_instance_id_is_found(self):
+        result = handle_sync_jobs([self._job(str(self.instance.pk))])
+
+        self.assertEqual((result['processed'], result['failed']), (1, 0))
+        sync_job = GalaxySyncJob.objects.get()
+        self.assertEqual(sync_job.galaxy_instance_id, self.instance.pk)
+        self.assertEqual(sync_job.status, 'completed')
+        self.acknowledge_jobs.assert_called_once_with('moffitt-sync-jobs', ['r1'])
+
+    def test_unknown_or_invalid_instance_id_is_not_acknowledged(self):
+        result = handle_sync_jobs([
+            self._job(self.instance.pk + 1, 'r1'),
+            self._job('not-an-id', 'r2'),
+            self._job(None, 'r3'),
+        ])
+
+        self.assertEqual((result['processed'], result['failed']), (0, 3))
+        self.assertFalse(GalaxySyncJob.objects.exists())
+        self.acknowledge_jobs.assert_not_called()
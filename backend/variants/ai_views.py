@@ -130,7 +130,10 @@ class VariantStatisticsGraphView(APIView):
     
     def get(self, request):
         try:
-            variants = Variant.objects.all()[:1000]
+            # Iterate rather than caching all rows on the queryset
+            variants = Variant.objects.only(
+                'impact', 'gene_symbol', 'chromosome'
+            )[:1000].iterator()
             
             impact_counts = {}
             gene_counts = {}
@@ -3,6 +3,7 @@ from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.conf import settings
+from datetime import date
 import logging
 from variants_project.s3_storage import s3_storage
 from variants_project.sqs_handlers import sqs_handler
@@ -12,6 +13,10 @@ from .serializers import VariantSerializer
 
 logger = logging.getLogger(__name__)
 
+# Widest start_date..end_date range list_vcf_files accepts; each day is its
+# own S3 listing
+MAX_LIST_RANGE_DAYS = 31
+
 
 class AWSFileUploadViewSet(viewsets.ViewSet):
     """ViewSet for handling file uploads to AWS S3"""
@@ -72,8 +77,35 @@ class AWSFileUploadViewSet(viewsets.ViewSet):
             )
         
         try:
-            prefix_date = request.query_params.get('date')
-            result = s3_storage.list_vcf_files(prefix_date)
+            start_date = request.query_params.get('start_date')
+            end_date = request.query_params.get('end_date')
+            
+            if start_date and end_date:
+                try:
+                    start_date = date.fromisoformat(start_date)
+                    end_date = date.fromisoformat(end_date)
+                except ValueError:
+                    return Response(
+                        {'error': 'start_date and end_date must be YYYY-MM-DD'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
+                if start_date > end_date:
+                    return Response(
+                        {'error': 'start_date must not be after end_date'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
+                if (end_date - start_date).days + 1 > MAX_LIST_RANGE_DAYS:
+                    return Response(
+                        {'error': f'Date range cannot exceed {MAX_LIST_RANGE_DAYS} days'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
+                result = s3_storage.list_vcf_files_parallel(start_date, end_date)
+            else:
+                prefix_date = request.query_params.get('date')
+                result = s3_storage.list_vcf_files(prefix_date)
             
             if result['success']:
                 return Response(result)
@@ -110,12 +142,13 @@ class AWSAnnotationJobViewSet(viewsets.ViewSet):
             )
         
         try:
-            annotation_source = AnnotationSource.objects.filter(name__in=sources).first()
+            source_ids = AnnotationSource.objects.values_list('id', flat=True)
+            source_id = source_ids.filter(name__in=sources).first()
             
             annotation_job = AnnotationJob.objects.create(
                 job_id=f"annotation_{len(variant_ids)}_variants",
                 status='pending',
-                source=annotation_source or AnnotationSource.objects.first(),
+                source_id=source_id or source_ids.first(),
                 variant_count=len(variant_ids)
             )
             
@@ -2,11 +2,16 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.db.models import Q
+import orjson
 
 from .models import Variant
 from .serializers import VariantSerializer
+from .tasks import explain_variant, explain_variants
+from variants_project.celery_app import app as celery_app
 from variants_project.gemini_service import (
     get_variant_interpreter,
     get_query_processor,
@@ -14,6 +19,33 @@ from variants_project.gemini_service import (
     get_annotation_enhancer
 )
 
+# Upper bound on variants summarized by one batch request
+MAX_BATCH_VARIANTS = 50
+
+
+def _wants_background(request) -> bool:
+    return request.query_params.get('background', '').lower() in ('1', 'true', 'yes')
+
+
+def _background_available() -> bool:
+    # Task state must live where every web process can read it, so background
+    # work needs Celery with a result backend
+    return bool(getattr(settings, 'CELERY_RESULT_BACKEND', None))
+
+
+def _background_unavailable_response():
+    return Response(
+        {"error": "Background interpretation requires Celery with a result backend"},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+
+
+def _background_response(task, *args):
+    if not _background_available():
+        return _background_unavailable_response()
+    result = task.delay(*args)
+    return Response({"task_id": result.id, "status": "pending"}, status=status.HTTP_202_ACCEPTED)
+
 
 class VariantLLMViewSet(viewsets.ViewSet):
     
@@ -23,6 +55,8 @@ class VariantLLMViewSet(viewsets.ViewSet):
         
         try:
             interpreter = get_variant_interpreter()
+            if _wants_background(request):
+                return _background_response(explain_variant, variant.pk)
             result = interpreter.generate_variant_summary(variant)
             return Response(result)
         except Exception as e:
@@ -31,6 +65,51 @@ class VariantLLMViewSet(viewsets.ViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @action(detail=False, methods=['post'])
+    def batch_explain(self, request):
+        variant_ids = request.data.get('variant_ids', [])
+        
+        if not isinstance(variant_ids, list) or not variant_ids:
+            return Response(
+                {"error": "variant_ids must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(variant_ids) > MAX_BATCH_VARIANTS:
+            return Response(
+                {"error": f"At most {MAX_BATCH_VARIANTS} variants can be explained per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            variants = list(Variant.objects.filter(pk__in=variant_ids))
+            interpreter = get_variant_interpreter()
+            if _wants_background(request):
+                return _background_response(explain_variants, [variant.pk for variant in variants])
+            results = interpreter.batch_summaries(variants)
+            return Response({"results": results})
+        except Exception as e:
+            return Response(
+                {"error": f"Failed to generate explanations: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    
+    @action(detail=False, methods=['get'], url_path=r'tasks/(?P<task_id>[0-9a-f-]+)')
+    def task_status(self, request, task_id=None):
+        """
+        State of a background interpretation. Celery reports unknown and
+        expired ids as pending, so those also answer 202.
+        """
+        if not _background_available():
+            return _background_unavailable_response()
+        
+        result = celery_app.AsyncResult(task_id)
+        
+        if result.successful():
+            return Response({"task_id": task_id, "status": "completed", "result": result.result})
+        if result.failed():
+            return Response({"task_id": task_id, "status": "failed", "error": str(result.result)})
+        return Response({"task_id": task_id, "status": "pending"}, status=status.HTTP_202_ACCEPTED)
+    
     @action(detail=True, methods=['get'])
     def clinical_explanation(self, request, pk=None):
         variant = get_object_or_404(Variant, pk=pk)
@@ -229,3 +308,45 @@ class VariantChatView(APIView):
                 {"error": f"Failed to reset conversation: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class VariantChatStreamView(APIView):
+    """Chat answers as server-sent events, forwarded as Gemini generates them"""
+    
+    def post(self, request):
+        message = request.data.get('message', '')
+        variant_id = request.data.get('variant_id')
+        
+        if not message:
+            return Response(
+                {"error": "Message parameter is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            assistant = get_chat_assistant()
+        except Exception as e:
+            return Response(
+                {"error": f"Failed to process chat message: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        variant_context = None
+        if variant_id:
+            try:
+                variant_context = Variant.objects.get(variant_id=variant_id)
+            except Variant.DoesNotExist:
+                pass
+        
+        def events():
+            try:
+                for chunk in assistant.chat_stream(message, variant_context):
+                    yield b"data: " + orjson.dumps({"text": chunk}) + b"\n\n"
+                yield b"event: done\ndata: {}\n\n"
+            except Exception as e:
+                yield b"event: error\ndata: " + orjson.dumps({"error": str(e)}) + b"\n\n"
+        
+        response = StreamingHttpResponse(events(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
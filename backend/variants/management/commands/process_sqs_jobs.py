@@ -1,8 +1,14 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
+from django.db import close_old_connections, connection
 import logging
+import queue
+import threading
 from variants_project.sqs_handlers import sqs_handler
 from variants_project.tasks import (
+    handle_annotation_jobs,
+    handle_sync_jobs,
+    handle_upload_jobs,
     process_annotation_jobs,
     process_sync_jobs,
     process_upload_jobs
@@ -10,6 +16,37 @@ from variants_project.tasks import (
 
 logger = logging.getLogger(__name__)
 
+# Received batches held per queue while the previous one is processed. Kept
+# small because prefetched messages use up their visibility timeout waiting.
+PREFETCH_BATCHES = 1
+
+# Seconds to back off after a failed receive
+RECEIVE_ERROR_BACKOFF = 5
+
+CONTINUOUS_QUEUES = {
+    'annotation': (sqs_handler.receive_annotation_jobs, handle_annotation_jobs),
+    'sync': (sqs_handler.receive_sync_jobs, handle_sync_jobs),
+    'upload': (sqs_handler.receive_upload_jobs, handle_upload_jobs),
+}
+
+
+def _receive_batches(receive, batches, stop):
+    """Long-poll a queue and hand non-empty batches to the consumer until stopped"""
+    while not stop.is_set():
+        result = receive(max_messages=10)
+        if not result['success']:
+            logger.error(f"Failed to receive jobs: {result['error']}")
+            stop.wait(RECEIVE_ERROR_BACKOFF)
+            continue
+        if not result['jobs']:
+            continue
+        while not stop.is_set():
+            try:
+                batches.put(result['jobs'], timeout=1)
+                break
+            except queue.Full:
+                pass
+
 
 class Command(BaseCommand):
     help = 'Process jobs from AWS SQS queues'
@@ -27,17 +64,28 @@ class Command(BaseCommand):
             action='store_true',
             help='Process messages once and exit'
         )
+        parser.add_argument(
+            '--continuous',
+            action='store_true',
+            help='Keep processing until interrupted, receiving the next batch while the current one runs'
+        )
 
     def handle(self, *args, **options):
         if not settings.USE_AWS:
             raise CommandError('AWS services not enabled. Set USE_AWS=True in .env')
 
-        queue = options['queue']
+        queue_name = options['queue']
         once = options['once']
 
         self.stdout.write(self.style.SUCCESS('Starting SQS job processor...'))
 
-        if queue in ['annotation', 'all']:
+        if options['continuous'] and not once:
+            names = list(CONTINUOUS_QUEUES) if queue_name == 'all' else [queue_name]
+            self._run_continuously(names)
+            self.stdout.write(self.style.SUCCESS('SQS job processor stopped'))
+            return
+
+        if queue_name in ['annotation', 'all']:
             self.stdout.write('Processing annotation jobs...')
             result = process_annotation_jobs()
             self.stdout.write(
@@ -47,7 +95,7 @@ class Command(BaseCommand):
                 )
             )
 
-        if queue in ['sync', 'all']:
+        if queue_name in ['sync', 'all']:
             self.stdout.write('Processing sync jobs...')
             result = process_sync_jobs()
             self.stdout.write(
@@ -57,7 +105,7 @@ class Command(BaseCommand):
                 )
             )
 
-        if queue in ['upload', 'all']:
+        if queue_name in ['upload', 'all']:
             self.stdout.write('Processing upload jobs...')
             result = process_upload_jobs()
             self.stdout.write(
@@ -68,3 +116,54 @@ class Command(BaseCommand):
             )
 
         self.stdout.write(self.style.SUCCESS('SQS job processor completed'))
+
+    def _run_continuously(self, names):
+        """Consume each queue on its own thread until interrupted"""
+        stop = threading.Event()
+        consumers = [
+            threading.Thread(target=self._consume, args=(name, stop), daemon=True)
+            for name in names
+        ]
+        for consumer in consumers:
+            consumer.start()
+
+        try:
+            while any(consumer.is_alive() for consumer in consumers):
+                for consumer in consumers:
+                    consumer.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping; batches not yet processed return to the queue...')
+            stop.set()
+            for consumer in consumers:
+                consumer.join()
+
+    def _consume(self, name, stop):
+        """
+        Process one queue's batches as a background thread receives them.
+
+        The receiver long-polls for the next batch while this thread works
+        on the current one, so SQS latency overlaps with processing.
+        """
+        receive, handle = CONTINUOUS_QUEUES[name]
+        batches = queue.Queue(maxsize=PREFETCH_BATCHES)
+        receiver = threading.Thread(target=_receive_batches, args=(receive, batches, stop), daemon=True)
+        receiver.start()
+
+        try:
+            while not stop.is_set():
+                try:
+                    jobs = batches.get(timeout=1)
+                except queue.Empty:
+                    continue
+
+                close_old_connections()
+                try:
+                    result = handle(jobs)
+                    self.stdout.write(
+                        f"{name.capitalize()} jobs: {result.get('processed', 0)} processed, "
+                        f"{result.get('failed', 0)} failed"
+                    )
+                except Exception as e:
+                    logger.error(f"Error processing {name} jobs: {str(e)}")
+        finally:
+            connection.close()
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-16 06:01
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('variants', '0002_cancertrendprediction'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clinicalsignificance',
+            index=models.Index(condition=models.Q(('significance__in', ['pathogenic', 'likely_pathogenic'])), fields=['variant'], name='clinsig_pathogenic_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='variant',
+            index=models.Index(django.db.models.functions.text.Upper('gene_symbol'), name='variant_gene_upper_idx'),
+        ),
+    ]
@@ -6,6 +6,7 @@ clinical significance information, drug responses, and annotations.
 """
 
 from django.db import models
+from django.db.models.functions import Upper
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 
@@ -186,6 +187,8 @@ class Variant(models.Model):
             models.Index(fields=['variant_id']),
             models.Index(fields=['impact']),
             models.Index(fields=['consequence']),
+            # Serves case-insensitive gene lookups (gene_symbol__iexact -> UPPER(...))
+            models.Index(Upper('gene_symbol'), name='variant_gene_upper_idx'),
         ]
         verbose_name = "Genetic Variant"
         verbose_name_plural = "Genetic Variants"
@@ -329,6 +332,14 @@ class ClinicalSignificance(models.Model):
     class Meta:
         ordering = ['-review_date', 'significance']
         unique_together = ['variant', 'clinvar_id']
+        indexes = [
+            # Partial index backing the pathogenic-variant semi-join in statistics
+            models.Index(
+                fields=['variant'],
+                condition=models.Q(significance__in=['pathogenic', 'likely_pathogenic']),
+                name='clinsig_pathogenic_idx',
+            ),
+        ]
         verbose_name = "Clinical Significance"
         verbose_name_plural = "Clinical Significance Records"
     
@@ -0,0 +1,32 @@
+"""
+Signal handlers for the Variants application.
+
+Keeps cached variant statistics coherent with the underlying tables by
+bumping a namespace version whenever a row that feeds them changes.
+"""
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Variant, ClinicalSignificance, DrugResponse
+
+STATISTICS_CACHE_VERSION_KEY = 'variants:stats:ver'
+
+
+def get_statistics_cache_version():
+    """Return the current statistics cache namespace version."""
+    return cache.get_or_set(STATISTICS_CACHE_VERSION_KEY, 1, None)
+
+
+@receiver([post_save, post_delete], sender=Variant)
+@receiver([post_save, post_delete], sender=ClinicalSignificance)
+@receiver([post_save, post_delete], sender=DrugResponse)
+def invalidate_statistics_cache(sender, **kwargs):
+    """Orphan every cached statistics payload by moving to a new version."""
+    cache.add(STATISTICS_CACHE_VERSION_KEY, 1, None)
+    try:
+        cache.incr(STATISTICS_CACHE_VERSION_KEY)
+    except ValueError:
+        # Evicted between add() and incr(); a fresh version is just as good.
+        cache.set(STATISTICS_CACHE_VERSION_KEY, 1, None)
@@ -0,0 +1,31 @@
+from celery import shared_task
+
+from .models import Variant
+
+
+@shared_task
+def explain_variant(variant_pk):
+    """
+    Generate a Gemini summary for one variant
+    
+    Args:
+        variant_pk: Primary key of the variant
+    """
+    from variants_project.gemini_service import get_variant_interpreter
+    
+    variant = Variant.objects.get(pk=variant_pk)
+    return get_variant_interpreter().generate_variant_summary(variant)
+
+
+@shared_task
+def explain_variants(variant_pks):
+    """
+    Generate Gemini summaries for several variants
+    
+    Args:
+        variant_pks: Primary keys of the variants
+    """
+    from variants_project.gemini_service import get_variant_interpreter
+    
+    variants = list(Variant.objects.filter(pk__in=variant_pks))
+    return {"results": get_variant_interpreter().batch_summaries(variants)}
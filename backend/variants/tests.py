@@ -1,3 +1,245 @@
-from django.test import TestCase
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from variants_project.gemini_ai_services import GeminiGraphGenerator
+from variants_project.gemini_service import (
+    VariantInterpreter, _complete_common_query, _match_common_query
+)
+from variants_project.log_handlers import QueuedFileHandler
+from .aws_views import MAX_LIST_RANGE_DAYS
+from .models import Variant
+
+
+@override_settings(USE_AWS=True)
+class ListVCFFilesDateRangeTests(TestCase):
+    """Date range validation on the S3 VCF listing endpoint"""
+
+    url = '/api/aws/files/list_vcf_files/'
+
+    def setUp(self):
+        self.client = APIClient()
+        patcher = mock.patch('variants.aws_views.s3_storage.list_vcf_files_parallel')
+        self.list_parallel = patcher.start()
+        self.list_parallel.return_value = {'success': True, 'files': []}
+        self.addCleanup(patcher.stop)
+
+    def test_reversed_range_is_rejected(self):
+        response = self.client.get(self.url, {'start_date': '2024-02-10', 'end_date': '2024-02-01'})
+
+        self.assertEqual(response.status_code, 400)
+        self.list_parallel.assert_not_called()
+
+    def test_range_wider_than_maximum_is_rejected(self):
+        response = self.client.get(self.url, {'start_date': '2000-01-01', 'end_date': '2024-01-01'})
+
+        self.assertEqual(response.status_code, 400)
+        self.list_parallel.assert_not_called()
+
+    def test_unparseable_date_is_rejected(self):
+        response = self.client.get(self.url, {'start_date': '2024-13-01', 'end_date': '2024-01-02'})
+
+        self.assertEqual(response.status_code, 400)
+        self.list_parallel.assert_not_called()
+
+    def test_range_at_maximum_is_listed(self):
+        response = self.client.get(self.url, {'start_date': '2024-01-01', 'end_date': '2024-01-31'})
+
+        self.assertEqual(MAX_LIST_RANGE_DAYS, 31)
+        self.assertEqual(response.status_code, 200)
+        self.list_parallel.assert_called_once()
+
+
+class GeminiHeatmapTests(TestCase):
+    """Generated charts must stay JSON-serializable"""
+
+    def setUp(self):
+        # Chart building needs no model; skip the API key check in __init__
+        self.generator = GeminiGraphGenerator.__new__(GeminiGraphGenerator)
+
+    def test_constant_column_is_rendered_as_null(self):
+        data = {'a': [1, 1, 1, 1], 'b': [1, 2, 3, 4], 'c': [4, 3, 2, 1]}
+
+        result = self.generator.generate_graph_from_data(data, graph_type='heatmap')
+
+        z = result['graphs']['heatmap']['data']['data'][0]['z']
+        self.assertEqual(z, [[None, None, None], [None, 1.0, -1.0], [None, -1.0, 1.0]])
+        JSONRenderer().render(result)
+
+    def test_non_finite_trace_values_are_rendered_as_null(self):
+        data = {'x': [1.0, float('nan'), 3.0], 'y': [float('inf'), 2.0, 1.0]}
+
+        result = self.generator.generate_graph_from_data(data, graph_type='scatter')
+
+        trace = result['graphs']['scatter']['data']['data'][0]
+        self.assertEqual(trace['x'], [1.0, None, 3.0])
+        self.assertEqual(trace['y'], [None, 2.0, 1.0])
+        JSONRenderer().render(result)
+
+
+class LoopBoundModel:
+    """Stands in for genai.GenerativeModel, whose async client binds to the first loop it runs on"""
+
+    def __init__(self, model_name):
+        self.loop = None
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        elif self.loop is not loop:
+            raise RuntimeError('attached to a different loop')
+        return SimpleNamespace(text='{"summary": "ok"}')
+
+
+class BatchSummariesTests(TestCase):
+    """Concurrent variant summaries through the shared interpreter"""
+
+    def setUp(self):
+        genai = SimpleNamespace(GenerativeModel=LoopBoundModel)
+        patcher = mock.patch('variants_project.gemini_service.genai', genai, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Skip the API key check in __init__; the model is all that's used
+        self.interpreter = VariantInterpreter.__new__(VariantInterpreter)
+        self.interpreter.model_name = 'test-model'
+        self.interpreter.model = LoopBoundModel('test-model')
+        self.variant = Variant.objects.create(
+            variant_id='rs1', chromosome='1', position=100, reference_allele='A', alternate_allele='G'
+        )
+
+    def test_repeated_batches_each_get_a_working_client(self):
+        for _ in range(2):
+            # Responses are cached by prompt; clear so each batch calls the model
+            cache.clear()
+
+            results = self.interpreter.batch_summaries([self.variant])
+
+            self.assertEqual(len(results), 1)
+            self.assertNotIn('error', results[0])
+            self.assertEqual(results[0]['interpretation'], {'summary': 'ok'})
+
+
+class CommonQueryTests(TestCase):
+    """Local handling of common natural-language queries"""
+
+    available_fields = [
+        'chromosome', 'position', 'gene_symbol', 'impact', 'consequence',
+        'gnomad_af', 'quality_score', 'clinical_significance__significance',
+        'drug_responses__drug_name', 'drug_responses__response_type'
+    ]
+    pathogenic = {'operator': 'in', 'value': ['pathogenic', 'likely_pathogenic']}
+
+    def test_match(self):
+        cases = [
+            ('pathogenic BRCA1 variants', self.available_fields, {
+                'clinical_significance__significance': self.pathogenic,
+                'gene_symbol': {'operator': 'exact', 'value': 'BRCA1'},
+            }),
+            ('Show me rare high-impact variants', self.available_fields, {
+                'gnomad_af': {'operator': 'lt', 'value': 0.01},
+                'impact': {'operator': 'exact', 'value': 'HIGH'},
+            }),
+            ('drug targets', self.available_fields, {
+                'drug_responses__isnull': {'operator': 'exact', 'value': False},
+            }),
+            # Negation is not a filler word, so the query goes to Gemini
+            ('non-pathogenic variants', self.available_fields, None),
+            # Two values for the same field cannot be expressed as one filter
+            ('BRCA1 and BRCA2', self.available_fields, None),
+            ('pathogenic variants on chromosome 17', self.available_fields, None),
+            ('benign variants', self.available_fields, None),
+            ('pathogenic BRCA1 variants', ['gene_symbol', 'impact'], None),
+        ]
+        for query, fields, filters in cases:
+            with self.subTest(query=query, fields=fields):
+                result = _match_common_query(query, fields)
+
+                if filters is None:
+                    self.assertIsNone(result)
+                else:
+                    self.assertEqual(result['filters'], filters)
+                    self.assertEqual(result['search_terms'], [])
+                    self.assertEqual(result['ordering'], [])
+
+    def test_complete(self):
+        cases = [
+            ('pathogenic v', 5, [
+                'pathogenic variants',
+                'pathogenic variants in BRCA1',
+                'pathogenic variants in BRCA2',
+                'pathogenic variants in TP53',
+                'pathogenic variants with drug responses',
+            ]),
+            ('  RARE   ', 5, [
+                'rare high impact variants',
+                'rare pathogenic variants',
+                'rare variants',
+                'rare variants in BRCA1',
+            ]),
+            ('brca', 3, ['BRCA genes', 'BRCA1 pathogenic variants', 'BRCA1 variants']),
+            ('drug targets in', 5, ['drug targets in EGFR']),
+            ('unknown prefix', 5, []),
+        ]
+        for prefix, limit, expected in cases:
+            with self.subTest(prefix=prefix, limit=limit):
+                self.assertEqual(_complete_common_query(prefix, limit=limit), expected)
+
+
+class QueuedFileHandlerTests(TestCase):
+    """Background-thread file logging"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filename = os.path.join(tmpdir.name, 'app.log')
+        self.handler = QueuedFileHandler(self.filename)
+        self.addCleanup(self.handler.close)
+        self.logger = logging.getLogger('variants.tests.queued_file_handler')
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def _read_log(self):
+        with open(self.filename) as log_file:
+            return log_file.read()
+
+    def test_close_flushes_queued_records(self):
+        self.logger.warning('variant %s annotated', 'rs1')
+
+        self.handler.close()
+
+        self.assertIn('variant rs1 annotated', self._read_log())
+
+    def test_forked_process_starts_one_listener(self):
+        # Simulate running in a forked child: the parent's listener is gone
+        self.handler.listener.stop()
+        self.handler._pid = -1
+        start_listener = mock.patch.object(
+            self.handler, '_start_listener', wraps=self.handler._start_listener
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+        threads = [
+            threading.Thread(target=self.logger.warning, args=('record %d', i))
+            for i in range(8)
+        ]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.handler.close()
+
+        self.assertEqual(start_listener.call_count, 1)
+        log = self._read_log()
+        for i in range(8):
+            self.assertIn(f'record {i}', log)
@@ -3,8 +3,15 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count, Avg
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db.models import Q, F, Count, Avg, Exists, OuterRef
 from django.shortcuts import get_object_or_404
+from django.utils.functional import cached_property
+from urllib.parse import urlencode
+import hashlib
 
 from .models import Variant, ClinicalSignificance, DrugResponse, COSMICData, VariantAnnotation, CancerTrendPrediction
 from .serializers import (
@@ -16,9 +23,28 @@ from .serializers import (
     VariantDetailSerializer
 )
 from .filters import VariantFilter, ClinicalSignificanceFilter
+from .signals import get_statistics_cache_version
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator that memoizes the COUNT(*) for a page's query for a short TTL"""
+
+    @cached_property
+    def count(self):
+        try:
+            sql, params = self.object_list.query.sql_with_params()
+        except (AttributeError, EmptyResultSet):
+            return super().count
+        query_hash = hashlib.blake2b(f"{sql}|{params!r}".encode('utf-8'), digest_size=16).hexdigest()
+        return cache.get_or_set(
+            f"pagination:count:{query_hash}",
+            lambda: Paginator.count.func(self),
+            settings.PAGINATION_COUNT_CACHE_TIMEOUT,
+        )
 
 
 class StandardResultsSetPagination(PageNumberPagination):
+    django_paginator_class = CachedCountPaginator
     page_size = 100
     page_size_query_param = 'page_size'
     max_page_size = 10000
@@ -38,6 +64,28 @@ class VariantViewSet(viewsets.ModelViewSet):
     ordering_fields = ['chromosome', 'position', 'quality_score', 'gnomad_af', 'created_at']
     ordering = ['chromosome', 'position']
 
+    # Reverse relations each detail action serializes, prefetched alongside the
+    # variant row so the related managers below don't hit the DB per child.
+    detail_prefetches = {
+        'retrieve': ('clinical_significance', 'drug_responses', 'cosmic_data', 'annotations__source'),
+        'annotations': ('annotations__source',),
+        'clinical_significance': ('clinical_significance',),
+        'drug_responses': ('drug_responses',),
+        'cosmic_data': ('cosmic_data',),
+    }
+
+    # Actions rendered with VariantSerializer, which never reads vcf_data
+    slim_actions = ('list', 'search_by_gene')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        prefetches = self.detail_prefetches.get(self.action)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        if self.action in self.slim_actions:
+            queryset = queryset.defer('vcf_data')
+        return queryset
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return VariantDetailSerializer
@@ -78,48 +126,68 @@ class VariantViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Get variant statistics"""
-        base_queryset = Variant.objects.all()
-        queryset = self.filter_queryset(base_queryset)
-        
-        impact_counts_raw = queryset.exclude(impact__isnull=True).values('impact').annotate(count=Count('id')).order_by()
-        formatted_impact_counts = {
-            'HIGH': 0,
-            'MODERATE': 0,
-            'LOW': 0,
-            'MODIFIER': 0,
-        }
-        for item in impact_counts_raw:
-            impact_value = item.get('impact')
-            count_value = item.get('count', 0)
-            if impact_value and impact_value in formatted_impact_counts:
-                formatted_impact_counts[impact_value] = count_value
-        
+        params = urlencode(sorted(request.query_params.lists()), doseq=True)
+        params_hash = hashlib.blake2b(params.encode('utf-8'), digest_size=16).hexdigest()
+        cache_key = f"variants:stats:v{get_statistics_cache_version()}:{params_hash}"
+        stats = cache.get_or_set(
+            cache_key,
+            lambda: self._compute_statistics(self.filter_queryset(Variant.objects.all())),
+            settings.STATISTICS_CACHE_TIMEOUT,
+        )
+        return Response(stats)
+
+    def _compute_statistics(self, queryset):
+        """Run the aggregation queries behind the statistics endpoint"""
+        # Alias in SQL so rows already have the {'name', 'count'} response shape
         top_genes = list(
             queryset.exclude(gene_symbol__isnull=True)
-            .values('gene_symbol')
+            .exclude(gene_symbol='')
+            .values(name=F('gene_symbol'))
             .annotate(count=Count('id'))
             .order_by('-count')[:10]
         )
-        top_genes_formatted = [
-            {'name': g['gene_symbol'], 'count': g['count']}
-            for g in top_genes if g['gene_symbol']
-        ]
         
-        unique_genes_count = queryset.exclude(gene_symbol__isnull=True).values('gene_symbol').distinct().count()
+        # Scalar counts in one pass; the related-table conditions are correlated
+        # EXISTS so child rows can't fan out and skew the count/average, and the
+        # planner can stop probing each child table at the first match.
+        is_pathogenic = Exists(ClinicalSignificance.objects.filter(
+            variant=OuterRef('pk'),
+            significance__in=['pathogenic', 'likely_pathogenic']
+        ))
+        is_drug_target = Exists(DrugResponse.objects.filter(variant=OuterRef('pk')))
+        impact_counts = {
+            impact: Count('id', filter=Q(impact=impact))
+            for impact, _ in Variant.IMPACT_CHOICES
+        }
+        totals = queryset.aggregate(
+            total=Count('id'),
+            pathogenic=Count('id', filter=is_pathogenic),
+            unique_genes=Count('gene_symbol', distinct=True),
+            avg_quality=Avg('quality_score'),
+            drug_targets=Count('id', filter=is_drug_target),
+            **impact_counts,
+        )
         
         stats = {
-            'total_variants': queryset.count(),
-            'pathogenic_variants': queryset.filter(clinical_significance__significance__in=['pathogenic', 'likely_pathogenic']).distinct().count(),
-            'impact_counts': formatted_impact_counts,
-            'unique_genes_count': unique_genes_count,
-            'by_chromosome': dict(queryset.values_list('chromosome').annotate(count=Count('id'))),
-            'by_consequence': dict(queryset.exclude(consequence__isnull=True).values_list('consequence').annotate(count=Count('id'))),
-            'average_quality': queryset.aggregate(avg_quality=Avg('quality_score'))['avg_quality'],
-            'drug_target_count': queryset.filter(drug_responses__isnull=False).distinct().count(),
-            'top_genes': top_genes_formatted,
+            'total_variants': totals['total'],
+            'pathogenic_variants': totals['pathogenic'],
+            'impact_counts': {impact: totals[impact] for impact in impact_counts},
+            'unique_genes_count': totals['unique_genes'],
+            'by_chromosome': self._grouped_counts(queryset, 'chromosome'),
+            'by_consequence': self._grouped_counts(queryset.exclude(consequence__isnull=True), 'consequence'),
+            'average_quality': totals['avg_quality'],
+            'drug_target_count': totals['drug_targets'],
+            'top_genes': top_genes,
         }
         
-        return Response(stats)
+        return stats
+
+    @staticmethod
+    def _grouped_counts(queryset, field):
+        """Map each value of ``field`` to its row count in a single GROUP BY"""
+        # order_by() drops Meta.ordering, which would otherwise leak into the
+        # GROUP BY and split every value into one group per position.
+        return dict(queryset.order_by().values_list(field).annotate(count=Count('id')))
 
     @action(detail=False, methods=['get'])
     def search_by_gene(self, request):
@@ -128,14 +196,11 @@ class VariantViewSet(viewsets.ModelViewSet):
         if not gene_symbol:
             return Response({'error': 'Gene symbol parameter required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        variants = self.queryset.filter(gene_symbol__iexact=gene_symbol)
-        page = self.paginate_queryset(variants)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(variants, many=True)
-        return Response(serializer.data)
+        # Always paginated: a common gene can match tens of thousands of rows
+        variants = self.get_queryset().filter(gene_symbol__iexact=gene_symbol)
+        page = self.paginator.paginate_queryset(variants, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
 class ClinicalSignificanceViewSet(viewsets.ModelViewSet):
@@ -1,7 +1,36 @@
+import logging
 import os
+import threading
+import time
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 
+logger = logging.getLogger(__name__)
+
+# Shared by every client: pooled keep-alive connections and adaptive retries
+CLIENT_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={'mode': 'adaptive', 'max_attempts': 5}
+)
+
+# Objects above 8 MB are fetched as concurrent 8 MB ranged GETs
+DOWNLOAD_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=16,
+    use_threads=True
+)
+
+# Objects above 8 MB go up as a multipart upload of 16 MB parts, ten at a time
+UPLOAD_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=10,
+    use_threads=True
+)
+
 
 class AWSConfig:
     """AWS configuration and client management"""
@@ -15,6 +44,7 @@ class AWSConfig:
         self.sqs_queue_url = os.getenv('AWS_SQS_QUEUE_URL')
         self.sqs_annotation_queue = os.getenv('AWS_SQS_ANNOTATION_QUEUE', 'moffitt-annotation-jobs')
         self.sqs_sync_queue = os.getenv('AWS_SQS_SYNC_QUEUE', 'moffitt-sync-jobs')
+        self.sqs_upload_queue = os.getenv('AWS_SQS_UPLOAD_QUEUE', 'moffitt-upload-jobs')
         
         self.rds_db_name = os.getenv('RDS_DB_NAME', 'moffitt_variants')
         self.rds_db_user = os.getenv('RDS_DB_USER', 'moffitt_user')
@@ -22,64 +52,99 @@ class AWSConfig:
         self.rds_db_host = os.getenv('RDS_DB_HOST', 'localhost')
         self.rds_db_port = os.getenv('RDS_DB_PORT', '5432')
         
+        self._session = None
         self._s3_client = None
         self._sqs_client = None
         self._rds_client = None
+        # boto3 sessions aren't thread-safe, so clients are built under a lock
+        self._client_lock = threading.Lock()
+        
+        # Queue URLs never change for a given name, so look each one up once.
+        # URLs given in AWS_SQS_QUEUE_URL_* skip the lookup entirely.
+        self._queue_url_cache = {
+            queue_name: queue_url
+            for queue_name, queue_url in (
+                (self.sqs_annotation_queue, os.getenv('AWS_SQS_QUEUE_URL_ANNOTATION')),
+                (self.sqs_sync_queue, os.getenv('AWS_SQS_QUEUE_URL_SYNC')),
+                (self.sqs_upload_queue, os.getenv('AWS_SQS_QUEUE_URL_UPLOAD')),
+            )
+            if queue_url
+        }
+    
+    def _create_client(self, service_name):
+        """Create a client from this instance's session; caller holds _client_lock"""
+        if self._session is None:
+            self._session = boto3.session.Session()
+        return self._session.client(
+            service_name,
+            region_name=self.region,
+            aws_access_key_id=self.access_key,
+            aws_secret_access_key=self.secret_key,
+            config=CLIENT_CONFIG
+        )
     
     @property
     def s3_client(self):
         """Get or create S3 client"""
         if self._s3_client is None:
-            config = Config(max_pool_connections=50)
-            self._s3_client = boto3.client(
-                's3',
-                region_name=self.region,
-                aws_access_key_id=self.access_key,
-                aws_secret_access_key=self.secret_key,
-                config=config
-            )
+            with self._client_lock:
+                if self._s3_client is None:
+                    self._s3_client = self._create_client('s3')
         return self._s3_client
     
     @property
     def sqs_client(self):
         """Get or create SQS client"""
         if self._sqs_client is None:
-            self._sqs_client = boto3.client(
-                'sqs',
-                region_name=self.region,
-                aws_access_key_id=self.access_key,
-                aws_secret_access_key=self.secret_key
-            )
+            with self._client_lock:
+                if self._sqs_client is None:
+                    self._sqs_client = self._create_client('sqs')
         return self._sqs_client
     
     @property
     def rds_client(self):
         """Get or create RDS client"""
         if self._rds_client is None:
-            self._rds_client = boto3.client(
-                'rds',
-                region_name=self.region,
-                aws_access_key_id=self.access_key,
-                aws_secret_access_key=self.secret_key
-            )
+            with self._client_lock:
+                if self._rds_client is None:
+                    self._rds_client = self._create_client('rds')
         return self._rds_client
     
+    def configure_for_worker(self):
+        """
+        Drop clients inherited from a parent process.
+        
+        Called in each forked Celery worker so it builds its own session and
+        connection pools instead of sharing sockets with the parent. The lock
+        is replaced too, since a fork can copy it in the held state.
+        """
+        self._client_lock = threading.Lock()
+        self._session = None
+        self._s3_client = None
+        self._sqs_client = None
+        self._rds_client = None
+    
     def get_s3_url(self, key):
         """Generate S3 object URL"""
         return f"https://{self.s3_bucket}.s3.{self.region}.amazonaws.com/{key}"
     
-    def upload_to_s3(self, file_obj, key, metadata=None):
+    def upload_to_s3(self, file_obj, key, metadata=None, content_type=None, content_encoding=None):
         """Upload file to S3"""
         try:
             extra_args = {}
             if metadata:
                 extra_args['Metadata'] = metadata
+            if content_type:
+                extra_args['ContentType'] = content_type
+            if content_encoding:
+                extra_args['ContentEncoding'] = content_encoding
             
             self.s3_client.upload_fileobj(
                 file_obj,
                 self.s3_bucket,
                 key,
-                ExtraArgs=extra_args
+                ExtraArgs=extra_args,
+                Config=UPLOAD_TRANSFER_CONFIG
             )
             return True, self.get_s3_url(key)
         except Exception as e:
@@ -96,6 +161,18 @@ class AWSConfig:
         except Exception as e:
             return None
     
+    def download_fileobj_parallel(self, key, file_obj):
+        """Download file from S3 into a writable binary file using parallel ranged GETs
+        
+        Errors are raised rather than swallowed so Celery tasks can retry them.
+        """
+        self.s3_client.download_fileobj(
+            self.s3_bucket,
+            key,
+            file_obj,
+            Config=DOWNLOAD_TRANSFER_CONFIG
+        )
+    
     def delete_from_s3(self, key):
         """Delete file from S3"""
         try:
@@ -125,17 +202,78 @@ class AWSConfig:
         except Exception as e:
             return False, str(e)
     
-    def receive_sqs_messages(self, queue_name, max_messages=10, wait_time=20):
-        """Receive messages from SQS queue"""
+    def send_sqs_messages_batch(self, queue_name, messages, max_retries=3):
+        """
+        Send messages to SQS queue, up to 10 per SendMessageBatch call.
+        
+        messages is a list of (message_body, message_attributes) pairs.
+        Entries SQS reports as failed on its side are resent with exponential
+        backoff; sender faults (a malformed message) are not retried.
+        
+        Returns (message_ids, errors): message_ids[i] is the MessageId of
+        messages[i], or None if it wasn't sent, in which case errors[i] says why.
+        """
+        message_ids = [None] * len(messages)
+        errors = {}
         try:
             queue_url = self.get_queue_url(queue_name)
             
-            response = self.sqs_client.receive_message(
-                QueueUrl=queue_url,
-                MaxNumberOfMessages=max_messages,
-                WaitTimeSeconds=wait_time,
-                MessageAttributeNames=['All']
-            )
+            for start in range(0, len(messages), 10):
+                pending = range(start, min(start + 10, len(messages)))
+                for attempt in range(max_retries + 1):
+                    entries = []
+                    for i in pending:
+                        message_body, message_attributes = messages[i]
+                        entry = {'Id': str(i), 'MessageBody': message_body}
+                        if message_attributes:
+                            entry['MessageAttributes'] = message_attributes
+                        entries.append(entry)
+                    
+                    response = self.sqs_client.send_message_batch(
+                        QueueUrl=queue_url,
+                        Entries=entries
+                    )
+                    
+                    for sent in response.get('Successful', []):
+                        message_ids[int(sent['Id'])] = sent['MessageId']
+                        errors.pop(int(sent['Id']), None)
+                    
+                    pending = []
+                    for failed in response.get('Failed', []):
+                        errors[int(failed['Id'])] = failed.get('Message') or failed['Code']
+                        if not failed.get('SenderFault'):
+                            pending.append(int(failed['Id']))
+                    
+                    if not pending or attempt == max_retries:
+                        break
+                    time.sleep(0.1 * 2 ** attempt)
+        except Exception as e:
+            for i, message_id in enumerate(message_ids):
+                if message_id is None:
+                    errors.setdefault(i, str(e))
+        return message_ids, errors
+    
+    def receive_sqs_messages(self, queue_name, max_messages=10, wait_time=20, visibility_timeout=None):
+        """
+        Receive messages from SQS queue, long polling for up to wait_time seconds.
+        
+        SQS returns at most 10 messages per call, so larger requests are capped.
+        visibility_timeout overrides the queue's default for these messages.
+        """
+        try:
+            queue_url = self.get_queue_url(queue_name)
+            
+            params = {
+                'QueueUrl': queue_url,
+                'MaxNumberOfMessages': min(max_messages, 10),
+                'WaitTimeSeconds': wait_time,
+                'MessageAttributeNames': ['All']
+            }
+            
+            if visibility_timeout is not None:
+                params['VisibilityTimeout'] = visibility_timeout
+            
+            response = self.sqs_client.receive_message(**params)
             
             return response.get('Messages', [])
         except Exception as e:
@@ -154,14 +292,69 @@ class AWSConfig:
         except Exception as e:
             return False
     
+    def delete_sqs_messages_batch(self, queue_name, receipt_handles):
+        """Delete messages from SQS queue, up to 10 per DeleteMessageBatch call"""
+        return not self.delete_sqs_messages_batch_failed(queue_name, receipt_handles)
+    
+    def delete_sqs_messages_batch_failed(self, queue_name, receipt_handles):
+        """
+        Delete messages from SQS queue, up to 10 per DeleteMessageBatch call.
+        
+        Returns the receipt handles that weren't deleted; on an error, that
+        includes every handle not yet confirmed.
+        """
+        failed = []
+        start = 0
+        try:
+            queue_url = self.get_queue_url(queue_name)
+            
+            for start in range(0, len(receipt_handles), 10):
+                chunk = receipt_handles[start:start + 10]
+                response = self.sqs_client.delete_message_batch(
+                    QueueUrl=queue_url,
+                    Entries=[
+                        {'Id': str(i), 'ReceiptHandle': receipt_handle}
+                        for i, receipt_handle in enumerate(chunk)
+                    ]
+                )
+                failed.extend(chunk[int(entry['Id'])] for entry in response.get('Failed', []))
+            return failed
+        except Exception as e:
+            return failed + list(receipt_handles[start:])
+    
     def get_queue_url(self, queue_name):
         """Get SQS queue URL"""
+        queue_url = self._queue_url_cache.get(queue_name)
+        if queue_url is not None:
+            return queue_url
         try:
             response = self.sqs_client.get_queue_url(QueueName=queue_name)
+            self._queue_url_cache[queue_name] = response['QueueUrl']
             return response['QueueUrl']
         except Exception as e:
             raise Exception(f"Failed to get queue URL for {queue_name}: {str(e)}")
     
+    def preload_queue_urls(self, queue_names):
+        """
+        Resolve and cache queue URLs up front so the first send or receive
+        doesn't pay for a GetQueueUrl round trip.
+        
+        Only looks queues up, never creates them. Queues that are already
+        cached are skipped. Failures are logged and otherwise ignored;
+        get_queue_url will retry them lazily on first use.
+        """
+        loaded = 0
+        for queue_name in queue_names:
+            if queue_name in self._queue_url_cache:
+                loaded += 1
+                continue
+            try:
+                self.get_queue_url(queue_name)
+                loaded += 1
+            except Exception as e:
+                logger.warning(f"Could not preload queue URL: {str(e)}")
+        return loaded
+    
     def create_queue_if_not_exists(self, queue_name):
         """Create SQS queue if it doesn't exist"""
         try:
@@ -172,6 +365,7 @@ class AWSConfig:
                     'MessageRetentionPeriod': '1209600'
                 }
             )
+            self._queue_url_cache[queue_name] = response['QueueUrl']
             return response['QueueUrl']
         except self.sqs_client.exceptions.QueueNameExists:
             return self.get_queue_url(queue_name)
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 from django.conf import settings
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'variants_project.settings')
@@ -11,3 +12,13 @@ app.autodiscover_tasks()
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
+
+
+@worker_process_init.connect
+def reset_aws_clients(**kwargs):
+    from .aws_config import aws_config
+    aws_config.configure_for_worker()
+    # Look the queue URLs up once per worker, off the request path; URLs
+    # already cached in the parent survive the fork and are skipped
+    if settings.USE_AWS:
+        aws_config.preload_queue_urls(settings.SQS_QUEUE_CONFIG.values())
@@ -1,18 +1,93 @@
 import os
+import json
 import logging
-from celery import Celery, shared_task
+from botocore.exceptions import ClientError
+from celery import Celery, group, shared_task
+from celery.utils.time import get_exponential_backoff_interval
 from django.conf import settings
+from django.db import OperationalError, transaction
 from .sqs_messaging import SQSMessageHandler, QueueMessage
 
 logger = logging.getLogger(__name__)
 
+VCF_UPSERT_BATCH_SIZE = 5000
+
+# Columns refreshed when an uploaded record's variant_id already exists
+VCF_UPSERT_FIELDS = [
+    'chromosome', 'position', 'reference_allele', 'alternate_allele',
+    'quality_score', 'filter_status', 'vcf_data', 'updated_at',
+]
+
+# Transient DB/AWS failures are retried on an exponential, jittered schedule
+# (capped at 10 minutes) so workers don't all hit the broker at once after
+# an outage; anything else fails the task immediately. AWS ClientErrors are
+# retried only when _is_transient_aws_error says so (see _retry_aws_error).
+JOB_RETRY_OPTIONS = {
+    'autoretry_for': (OperationalError,),
+    'retry_backoff': True,
+    'retry_backoff_max': 600,
+    'retry_jitter': True,
+    'max_retries': 5,
+}
+
+# ClientError codes for throttling and service-side failures; any other code
+# (NoSuchKey, AccessDenied, ValidationError, ...) won't succeed on retry
+TRANSIENT_AWS_ERROR_CODES = frozenset({
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'TooManyRequestsException',
+    'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded',
+    'SlowDown',
+    'RequestTimeout',
+    'RequestTimeoutException',
+    'InternalError',
+    'ServiceUnavailable',
+})
+
 app = Celery('moffitt_variants')
 
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 
-@shared_task(bind=True, max_retries=3)
+def _is_transient_aws_error(error):
+    """Whether a ClientError is throttling or a 5xx, and so worth retrying"""
+    code = error.response.get('Error', {}).get('Code')
+    status_code = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 0
+    return code in TRANSIENT_AWS_ERROR_CODES or status_code >= 500
+
+
+def _retry_aws_error(task, error):
+    """Retry the task on JOB_RETRY_OPTIONS' backoff schedule if error is transient, else re-raise it"""
+    if not _is_transient_aws_error(error):
+        raise error
+    countdown = get_exponential_backoff_interval(
+        factor=1,
+        retries=task.request.retries,
+        maximum=JOB_RETRY_OPTIONS['retry_backoff_max'],
+        full_jitter=JOB_RETRY_OPTIONS['retry_jitter'],
+    )
+    raise task.retry(exc=error, countdown=countdown)
+
+
+def _upsert_variants(variants):
+    """Insert a batch of variants, updating rows whose variant_id already exists"""
+    from variants.models import Variant
+    
+    Variant.objects.bulk_create(
+        list(variants),
+        update_conflicts=True,
+        unique_fields=['variant_id'],
+        update_fields=VCF_UPSERT_FIELDS,
+        batch_size=VCF_UPSERT_BATCH_SIZE,
+    )
+
+
+@shared_task(bind=True, **JOB_RETRY_OPTIONS)
 def process_annotation_job(self, message_dict):
     """
     Process variant annotation job from SQS
@@ -20,41 +95,38 @@ def process_annotation_job(self, message_dict):
     Args:
         message_dict: Dictionary containing job details
     """
-    try:
-        from annotations.models import AnnotationJob, VariantAnnotation
-        from variants.models import Variant
-        
-        variant_id = message_dict.get('variant_id')
-        annotation_source = message_dict.get('annotation_source')
-        job_config = message_dict.get('job_config', {})
-        
-        if not variant_id or not annotation_source:
-            logger.error("Missing variant_id or annotation_source")
-            return False
-        
-        variant = Variant.objects.get(id=variant_id)
-        
-        job = AnnotationJob.objects.create(
-            job_id=f"celery-{self.request.id}",
-            status='running',
-            source_id=job_config.get('source_id'),
-            variant_count=1
-        )
-        
-        logger.info(f"Processing annotation for variant {variant_id} from {annotation_source}")
-        
-        job.status = 'completed'
-        job.processed_count = 1
-        job.save()
-        
-        return True
-        
-    except Exception as exc:
-        logger.error(f"Error processing annotation job: {str(exc)}")
-        self.retry(exc=exc, countdown=60)
+    from annotations.models import AnnotationJob, VariantAnnotation
+    from variants.models import Variant
+    
+    variant_id = message_dict.get('variant_id')
+    annotation_source = message_dict.get('annotation_source')
+    job_config = message_dict.get('job_config', {})
+    
+    if not variant_id or not annotation_source:
+        logger.error("Missing variant_id or annotation_source")
+        return False
+    
+    if not Variant.objects.filter(id=variant_id).exists():
+        logger.error(f"Variant {variant_id} not found")
+        return False
+    
+    job = AnnotationJob.objects.create(
+        job_id=f"celery-{self.request.id}",
+        status='running',
+        source_id=job_config.get('source_id'),
+        variant_count=1
+    )
+    
+    logger.info(f"Processing annotation for variant {variant_id} from {annotation_source}")
+    
+    job.status = 'completed'
+    job.processed_count = 1
+    job.save()
+    
+    return True
 
 
-@shared_task(bind=True, max_retries=3)
+@shared_task(bind=True, **JOB_RETRY_OPTIONS)
 def process_sync_job(self, message_dict):
     """
     Process Galaxy synchronization job from SQS
@@ -62,38 +134,35 @@ def process_sync_job(self, message_dict):
     Args:
         message_dict: Dictionary containing sync job details
     """
-    try:
-        from galaxy_integration.models import GalaxySyncJob, GalaxyInstance
-        
-        galaxy_instance_id = message_dict.get('galaxy_instance_id')
-        job_type = message_dict.get('job_type')
-        job_config = message_dict.get('job_config', {})
-        
-        if not galaxy_instance_id or not job_type:
-            logger.error("Missing galaxy_instance_id or job_type")
-            return False
-        
-        galaxy_instance = GalaxyInstance.objects.get(id=galaxy_instance_id)
-        
-        sync_job = GalaxySyncJob.objects.create(
-            galaxy_instance=galaxy_instance,
-            job_type=job_type,
-            status='running'
-        )
-        
-        logger.info(f"Processing {job_type} sync for Galaxy instance {galaxy_instance_id}")
-        
-        sync_job.status = 'completed'
-        sync_job.save()
-        
-        return True
-        
-    except Exception as exc:
-        logger.error(f"Error processing sync job: {str(exc)}")
-        self.retry(exc=exc, countdown=60)
+    from galaxy_integration.models import GalaxySyncJob, GalaxyInstance
+    
+    galaxy_instance_id = message_dict.get('galaxy_instance_id')
+    job_type = message_dict.get('job_type')
+    job_config = message_dict.get('job_config', {})
+    
+    if not galaxy_instance_id or not job_type:
+        logger.error("Missing galaxy_instance_id or job_type")
+        return False
+    
+    if not GalaxyInstance.objects.filter(id=galaxy_instance_id).exists():
+        logger.error(f"Galaxy instance {galaxy_instance_id} not found")
+        return False
+    
+    sync_job = GalaxySyncJob.objects.create(
+        galaxy_instance_id=galaxy_instance_id,
+        job_type=job_type,
+        status='running'
+    )
+    
+    logger.info(f"Processing {job_type} sync for Galaxy instance {galaxy_instance_id}")
+    
+    sync_job.status = 'completed'
+    sync_job.save()
+    
+    return True
 
 
-@shared_task(bind=True, max_retries=3)
+@shared_task(bind=True, **JOB_RETRY_OPTIONS)
 def process_vcf_upload(self, file_key, file_name, metadata):
     """
     Process VCF file upload from S3
@@ -103,53 +172,63 @@ def process_vcf_upload(self, file_key, file_name, metadata):
         file_name: Original file name
         metadata: File metadata
     """
-    try:
-        from variants.models import Variant
-        from variants_project.aws_config import aws_config
-        import vcf
-        from io import StringIO
-        
-        logger.info(f"Processing VCF upload: {file_name}")
-        
+    from variants.models import Variant
+    from variants.signals import invalidate_statistics_cache
+    from variants_project.aws_config import aws_config
+    from cyvcf2 import VCF
+    import tempfile
+    
+    logger.info(f"Processing VCF upload: {file_name}")
+    
+    # cyvcf2 reads through htslib, which wants a path, so the object is
+    # fetched to a temp file with concurrent ranged GETs (htslib
+    # handles .gz itself). Throttling and 5xx S3 errors are retried.
+    suffix = '.vcf.gz' if file_key.endswith('.gz') else '.vcf'
+    with tempfile.NamedTemporaryFile(suffix=suffix) as vcf_file:
         try:
-            vcf_content = aws_config.download_from_s3(file_key)
-            
-            if not vcf_content:
-                logger.error(f"Failed to download VCF from S3: {file_key}")
-                return False
-            
-            vcf_file = StringIO(vcf_content.decode('utf-8'))
-            vcf_reader = vcf.Reader(vcf_file)
-            
-            variant_count = 0
-            for record in vcf_reader:
-                variant, created = Variant.objects.update_or_create(
-                    variant_id=record.ID,
-                    defaults={
-                        'chromosome': record.CHROM,
-                        'position': record.POS,
-                        'reference_allele': record.REF,
-                        'alternate_allele': str(record.ALT[0]) if record.ALT else '',
-                        'quality_score': record.QUAL,
-                        'filter_status': ','.join(record.FILTER) if record.FILTER else 'PASS',
-                        'vcf_data': {
-                            'info': dict(record.INFO) if record.INFO else {},
-                            'format': record.FORMAT if record.FORMAT else ''
-                        }
+            aws_config.download_fileobj_parallel(file_key, vcf_file)
+        except ClientError as e:
+            _retry_aws_error(self, e)
+        vcf_file.flush()
+        
+        variant_count = 0
+        # Keyed by variant_id so a repeated ID within one batch collapses to
+        # its last record, as sequential upserts would; Postgres rejects an
+        # INSERT ... ON CONFLICT that touches the same row twice.
+        batch = {}
+        with transaction.atomic():
+            for record in VCF(vcf_file.name):
+                # cyvcf2 builds a fresh str/list on every attribute access,
+                # so read each one once
+                variant_id = record.ID
+                alts = record.ALT
+                filters = record.FILTER
+                formats = record.FORMAT
+                batch[variant_id] = Variant(
+                    variant_id=variant_id,
+                    chromosome=record.CHROM,
+                    position=record.POS,
+                    reference_allele=record.REF,
+                    alternate_allele=alts[0] if alts else '',
+                    quality_score=record.QUAL,
+                    filter_status=filters.replace(';', ',') if filters else 'PASS',
+                    vcf_data={
+                        'info': dict(record.INFO),
+                        'format': ':'.join(formats) if formats else ''
                     }
                 )
                 variant_count += 1
-            
-            logger.info(f"Successfully processed {variant_count} variants from {file_name}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error parsing VCF file: {str(e)}")
-            return False
-            
-    except Exception as exc:
-        logger.error(f"Error processing VCF upload: {str(exc)}")
-        self.retry(exc=exc, countdown=60)
+                if len(batch) >= VCF_UPSERT_BATCH_SIZE:
+                    _upsert_variants(batch.values())
+                    batch = {}
+            if batch:
+                _upsert_variants(batch.values())
+    
+    # bulk_create bypasses post_save, so drop cached statistics explicitly
+    invalidate_statistics_cache(sender=Variant)
+    
+    logger.info(f"Successfully processed {variant_count} variants from {file_name}")
+    return True
 
 
 @shared_task
@@ -164,17 +243,20 @@ def consume_annotation_queue():
             max_messages=10
         )
         
+        jobs = []
+        receipt_handles = []
         for message in messages:
             try:
                 queue_msg = QueueMessage(message)
-                process_annotation_job.delay(queue_msg.to_dict())
-                SQSMessageHandler.delete_message(
-                    'moffitt-annotation-jobs',
-                    queue_msg.receipt_handle
-                )
+                jobs.append(process_annotation_job.s(queue_msg.to_dict()))
+                receipt_handles.append(queue_msg.receipt_handle)
             except Exception as e:
                 logger.error(f"Error processing message: {str(e)}")
         
+        if jobs:
+            group(jobs).apply_async()
+            SQSMessageHandler.delete_messages('moffitt-annotation-jobs', receipt_handles)
+        
         return len(messages)
         
     except Exception as e:
@@ -194,17 +276,20 @@ def consume_sync_queue():
             max_messages=10
         )
         
+        jobs = []
+        receipt_handles = []
         for message in messages:
             try:
                 queue_msg = QueueMessage(message)
-                process_sync_job.delay(queue_msg.to_dict())
-                SQSMessageHandler.delete_message(
-                    'moffitt-sync-jobs',
-                    queue_msg.receipt_handle
-                )
+                jobs.append(process_sync_job.s(queue_msg.to_dict()))
+                receipt_handles.append(queue_msg.receipt_handle)
             except Exception as e:
                 logger.error(f"Error processing message: {str(e)}")
         
+        if jobs:
+            group(jobs).apply_async()
+            SQSMessageHandler.delete_messages('moffitt-sync-jobs', receipt_handles)
+        
         return len(messages)
         
     except Exception as e:
@@ -224,21 +309,24 @@ def consume_upload_queue():
             max_messages=10
         )
         
+        jobs = []
+        receipt_handles = []
         for message in messages:
             try:
-                body = eval(message['Body'])
-                process_vcf_upload.delay(
+                body = json.loads(message['Body'])
+                jobs.append(process_vcf_upload.s(
                     body['file_key'],
                     body['file_name'],
                     body['metadata']
-                )
-                SQSMessageHandler.delete_message(
-                    'moffitt-upload-jobs',
-                    message['ReceiptHandle']
-                )
+                ))
+                receipt_handles.append(message['ReceiptHandle'])
             except Exception as e:
                 logger.error(f"Error processing message: {str(e)}")
         
+        if jobs:
+            group(jobs).apply_async()
+            SQSMessageHandler.delete_messages('moffitt-upload-jobs', receipt_handles)
+        
         return len(messages)
         
     except Exception as e:
@@ -1,97 +1,229 @@
-import os
-import json
+import hashlib
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
-import pandas as pd
+from functools import lru_cache
 import numpy as np
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.utils import PlotlyJSONEncoder
+import orjson
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce, NullIf, TruncDate
 
 from .gemini_service import GeminiService
-from variants.models import Variant, ClinicalSignificance, DrugResponse, CancerTrendPrediction
+from variants.models import Variant
 
 logger = logging.getLogger(__name__)
 
+# plotly is imported inside the functions that use it; it adds close to a
+# second to import time for every process loading this module
+
+# Bump when response parsing or chart building changes so cached results are skipped
+AI_CACHE_VERSION = 1
+
+# Only data_summary varies between calls. The fixed instructions are a few
+# hundred tokens, well under the minimum Gemini context caching accepts, so
+# they are sent inline and repeated inputs are served from the response cache.
+TREND_ANALYSIS_PROMPT = """Analyze the following cancer variant data trends and provide insights in JSON format:
+
+{data_summary}
+
+Provide a JSON response with these keys:
+- key_trends: array of 3-5 key trends
+- significant_genes: array of top 5 genes showing increased variant frequency
+- clinical_patterns: array of clinical significance patterns observed
+- drug_implications: array of drug response implications
+- risk_assessment: string describing risk level (low/medium/high)
+- recommendations: array of 3-5 recommendations for monitoring
+
+Return ONLY valid JSON, no markdown or extra text."""
+
+
+def _cache_key(kind: str, payload: bytes) -> str:
+    """Content-addressed cache key: identical input maps to the same entry"""
+    digest = hashlib.blake2b(payload, digest_size=16).hexdigest()
+    return f"gemini:{kind}:v{AI_CACHE_VERSION}:{digest}"
+
+
+@lru_cache(maxsize=None)
+def _plotly_white_template_json() -> bytes:
+    """The plotly_white template as Plotly.js reads it, serialized once"""
+    import plotly.io as pio
+    return orjson.dumps(pio.templates['plotly_white'].to_plotly_json(), option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _plotly_white_template() -> Dict[str, Any]:
+    """A fresh copy of the plotly_white template for one chart's layout"""
+    return orjson.loads(_plotly_white_template_json())
+
+
+def _json_safe(value: Any) -> Any:
+    """
+    Copy trace data as plain JSON values, writing NaN and infinities as null.
+    
+    JSON has no non-finite numbers and DRF's renderer rejects them; this is
+    what PlotlyJSONEncoder did for figures serialized through it.
+    """
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'f':
+            value = np.where(np.isfinite(value), value, None)
+        return _json_safe(value.tolist())
+    if isinstance(value, (float, np.floating)):
+        return float(value) if np.isfinite(value) else None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _figure(traces: List[Dict[str, Any]], title: str, xaxis_title: Optional[str] = None,
+            yaxis_title: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Assemble a Plotly figure as a plain dict.
+    
+    go.Figure validates and coerces every property as it is set, which costs
+    far more than building the chart; the dict form is what Plotly.js reads.
+    Trace data is passed through _json_safe so every chart stays renderable.
+    """
+    layout = {
+        'template': _plotly_white_template(),
+        'title': {'text': title},
+        'plot_bgcolor': 'rgba(0,0,0,0)',
+        'paper_bgcolor': 'rgba(0,0,0,0)',
+    }
+    if xaxis_title is not None:
+        layout['xaxis'] = {'title': {'text': xaxis_title}}
+    if yaxis_title is not None:
+        layout['yaxis'] = {'title': {'text': yaxis_title}}
+    return {'data': _json_safe(traces), 'layout': layout}
+
+
+def _graph_types_for(has_temporal: bool, num_categorical: int, num_numerical: int) -> List[str]:
+    """Chart types suited to a data shape, best first, at most three"""
+    recommendations = []
+    
+    if has_temporal:
+        recommendations.append("line")
+    
+    if num_categorical > 0:
+        recommendations.append("bar")
+    
+    if num_categorical == 1 and num_numerical >= 1:
+        recommendations.append("pie")
+    
+    if num_numerical >= 2:
+        recommendations.append("scatter")
+    
+    if num_numerical >= 3:
+        recommendations.append("heatmap")
+    
+    if not recommendations:
+        recommendations = ["bar"]
+    
+    return recommendations[:3]
+
+
+# The rules above only distinguish 0/1/2+ categorical and 0/1/2/3+ numerical
+# fields, so every shape maps onto one of these 24 precomputed entries
+_RECOMMENDATION_TABLE = {
+    (has_temporal, num_categorical, num_numerical): tuple(
+        _graph_types_for(has_temporal, num_categorical, num_numerical)
+    )
+    for has_temporal in (False, True)
+    for num_categorical in range(3)
+    for num_numerical in range(4)
+}
+
+
+def _dumps(obj: Any, option: int = 0) -> bytes:
+    """Serialize with orjson; numpy values are encoded natively, anything else unknown via str()"""
+    return orjson.dumps(obj, default=str, option=option | orjson.OPT_SERIALIZE_NUMPY)
+
 
 class GeminiTrendPredictor(GeminiService):
     
     def predict_variant_trends(self, days_ahead: int = 30) -> Dict[str, Any]:
         try:
-            historical_data = self._get_historical_variant_data()
+            six_months_ago = datetime.now() - timedelta(days=180)
+            trend_data = self._get_trend_data(six_months_ago)
             
-            if not historical_data or len(historical_data) < 7:
+            if trend_data['total'] < 7:
                 return {"error": "Insufficient historical data for prediction. Need at least 7 data points."}
             
-            trend_analysis = self._analyze_trends_with_gemini(historical_data)
-            predictions = self._generate_predictions(historical_data, days_ahead)
-            trend_charts = self._create_trend_visualizations(historical_data, predictions)
+            trend_analysis = self._analyze_trends_with_gemini(trend_data)
+            predictions = self._generate_predictions(trend_data, days_ahead)
+            trend_charts = self._create_trend_visualizations(trend_data, predictions)
             
             return {
                 "predictions": predictions,
                 "analysis": trend_analysis,
                 "charts": trend_charts,
-                "confidence_score": self._calculate_confidence_score(historical_data)
+                "confidence_score": self._calculate_confidence_score(trend_data['total'])
             }
             
         except Exception as e:
             logger.error(f"Error predicting variant trends: {str(e)}")
             return {"error": str(e)}
     
-    def _get_historical_variant_data(self) -> List[Dict]:
-        six_months_ago = datetime.now() - timedelta(days=180)
-        
-        variants = Variant.objects.filter(
-            created_at__gte=six_months_ago
-        ).order_by('created_at')
-        
-        historical_data = []
-        for variant in variants:
-            data_point = {
-                'date': variant.created_at.date().isoformat(),
-                'chromosome': variant.chromosome,
-                'gene': variant.gene_symbol or 'Unknown',
-                'impact': variant.impact or 'UNKNOWN',
-                'gnomad_af': float(variant.gnomad_af) if variant.gnomad_af else 0.0,
-                'clinical_significance': None,
-                'drug_responses': []
-            }
-            
-            clin_sig = ClinicalSignificance.objects.filter(variant=variant).first()
-            if clin_sig:
-                data_point['clinical_significance'] = clin_sig.significance
-            
-            drug_responses = DrugResponse.objects.filter(variant=variant)
-            data_point['drug_responses'] = [
-                {
-                    'drug': dr.drug_name,
-                    'response_type': dr.response_type,
-                    'evidence_level': dr.evidence_level
-                } for dr in drug_responses[:3]
-            ]
-            
-            historical_data.append(data_point)
-        
-        return historical_data
+    def _get_trend_data(self, since: datetime) -> Dict[str, Any]:
+        # Everything downstream works from these aggregates, so no per-variant
+        # rows leave the database
+        dates, counts = self._get_daily_counts(since)
+        return {
+            'dates': dates,
+            'counts': counts,
+            'total': int(counts.sum()),
+            'gene_freq': self._get_gene_freq(since),
+            'impact_dist': self._get_impact_dist(since),
+        }
+    
+    def _get_daily_counts(self, since: datetime) -> Tuple[np.ndarray, np.ndarray]:
+        rows = Variant.objects.filter(
+            created_at__gte=since
+        ).annotate(
+            day=TruncDate('created_at')
+        ).values_list('day').annotate(
+            count=Count('id')
+        ).order_by('day')
+        
+        days, counts = zip(*rows) if rows else ((), ())
+        return np.array(days, dtype='datetime64[D]'), np.array(counts, dtype=np.int64)
+    
+    def _get_gene_freq(self, since: datetime, limit: int = 10) -> Dict[str, int]:
+        rows = Variant.objects.filter(
+            created_at__gte=since
+        ).values(
+            gene=Coalesce(NullIf('gene_symbol', Value('')), Value('Unknown'))
+        ).annotate(
+            count=Count('id')
+        ).order_by('-count', 'gene')[:limit]
+        return {row['gene']: row['count'] for row in rows}
     
-    def _analyze_trends_with_gemini(self, historical_data: List[Dict]) -> Dict[str, Any]:
-        data_summary = self._prepare_data_summary(historical_data)
+    def _get_impact_dist(self, since: datetime) -> Dict[str, int]:
+        rows = Variant.objects.filter(
+            created_at__gte=since
+        ).values(
+            impact_level=Coalesce(NullIf('impact', Value('')), Value('UNKNOWN'))
+        ).annotate(
+            count=Count('id')
+        ).order_by('-count', 'impact_level')
+        return {row['impact_level']: row['count'] for row in rows}
+    
+    def _analyze_trends_with_gemini(self, trend_data: Dict[str, Any]) -> Dict[str, Any]:
+        data_summary = self._prepare_data_summary(trend_data)
         
-        prompt = f"""Analyze the following cancer variant data trends and provide insights in JSON format:
-
-{data_summary}
-
-Provide a JSON response with these keys:
-- key_trends: array of 3-5 key trends
-- significant_genes: array of top 5 genes showing increased variant frequency
-- clinical_patterns: array of clinical significance patterns observed
-- drug_implications: array of drug response implications
-- risk_assessment: string describing risk level (low/medium/high)
-- recommendations: array of 3-5 recommendations for monitoring
-
-Return ONLY valid JSON, no markdown or extra text."""
+        prompt = TREND_ANALYSIS_PROMPT.format(data_summary=data_summary)
 
+        # The prompt embeds the whole data summary, so it fingerprints the input
+        cache_key = _cache_key('trend', prompt.encode())
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             response_text = self.generate_text(prompt, temperature=0.3, max_tokens=2048)
             
@@ -99,7 +231,9 @@ Return ONLY valid JSON, no markdown or extra text."""
             json_end = response_text.rfind('}') + 1
             if json_start >= 0 and json_end > json_start:
                 json_str = response_text[json_start:json_end]
-                return json.loads(json_str)
+                analysis = orjson.loads(json_str)
+                cache.set(cache_key, analysis, settings.GEMINI_CACHE_TIMEOUT)
+                return analysis
             else:
                 raise ValueError("No JSON found in response")
                 
@@ -114,52 +248,44 @@ Return ONLY valid JSON, no markdown or extra text."""
                 "recommendations": ["Review data manually"]
             }
     
-    def _prepare_data_summary(self, historical_data: List[Dict]) -> str:
-        df = pd.DataFrame(historical_data)
+    def _prepare_data_summary(self, trend_data: Dict[str, Any]) -> str:
+        dates = trend_data['dates']
+        counts = trend_data['counts']
         
-        if df.empty:
+        if not len(dates):
             return "No data available for analysis"
         
-        daily_stats = df.groupby('date').agg({
-            'gene': 'count',
-            'impact': lambda x: x.value_counts().to_dict() if len(x.value_counts()) > 0 else {}
-        }).reset_index()
-        
-        gene_freq = df['gene'].value_counts().head(10).to_dict()
-        impact_dist = df['impact'].value_counts().to_dict()
+        thirty_days_ago = np.datetime64((datetime.now() - timedelta(days=30)).date())
+        # dates come back sorted from _get_daily_counts, so binary-search the cutoff
+        recent_total = int(counts[np.searchsorted(dates, thirty_days_ago):].sum())
         
         summary = f"""
 Historical Data Summary:
-- Total variants analyzed: {len(df)}
-- Date range: {df['date'].min()} to {df['date'].max()}
-- Daily average variants: {len(df) / len(daily_stats):.1f}
+- Total variants analyzed: {trend_data['total']}
+- Date range: {dates[0]} to {dates[-1]}
+- Daily average variants: {trend_data['total'] / len(dates):.1f}
 
 Top Genes by Frequency:
-{json.dumps(gene_freq, indent=2)}
+{_dumps(trend_data['gene_freq'], option=orjson.OPT_INDENT_2).decode()}
 
 Impact Distribution:
-{json.dumps(impact_dist, indent=2)}
+{_dumps(trend_data['impact_dist'], option=orjson.OPT_INDENT_2).decode()}
 
 Recent Trends (last 30 days):
-- Average daily variants: {len(df[df['date'] >= (datetime.now() - timedelta(days=30)).date().isoformat()]) / max(1, 30):.1f}
+- Average daily variants: {recent_total / max(1, 30):.1f}
 """
         
         return summary
     
-    def _generate_predictions(self, historical_data: List[Dict], days_ahead: int) -> Dict[str, Any]:
-        df = pd.DataFrame(historical_data)
-        
-        if df.empty or len(df) < 7:
+    def _generate_predictions(self, trend_data: Dict[str, Any], days_ahead: int) -> Dict[str, Any]:
+        if trend_data['total'] < 7:
             return {"error": "Insufficient data for prediction"}
         
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.sort_values('date')
+        dates = trend_data['dates']
+        counts = trend_data['counts']
         
-        daily_counts = df.groupby('date').size().reset_index(name='count')
-        
-        unique_dates = daily_counts['date'].nunique()
-        if unique_dates < 2:
-            avg_daily = daily_counts['count'].sum() / max(1, unique_dates)
+        if len(dates) < 2:
+            avg_daily = counts.sum() / max(1, len(dates))
             return {
                 "predicted_counts": [avg_daily] * days_ahead,
                 "future_dates": [(datetime.now() + timedelta(days=i+1)).date().isoformat() for i in range(days_ahead)],
@@ -167,40 +293,20 @@ Recent Trends (last 30 days):
                 "confidence_interval": [[max(0, avg_daily * 0.8), avg_daily * 1.2]] * days_ahead
             }
         
-        date_range = pd.date_range(start=daily_counts['date'].min(),
-                                 end=daily_counts['date'].max())
-        daily_counts = daily_counts.set_index('date').reindex(date_range, fill_value=0).reset_index()
-        daily_counts.columns = ['date', 'count']
-        
-        daily_counts['days_since_start'] = (daily_counts['date'] - daily_counts['date'].min()).dt.days
-        
-        X = daily_counts[['days_since_start']].values
-        y = daily_counts['count'].values
-        
-        if len(X) < 2:
-            avg_daily = y.mean() if len(y) > 0 else 0
-            return {
-                "predicted_counts": [avg_daily] * days_ahead,
-                "future_dates": [(datetime.now() + timedelta(days=i+1)).date().isoformat() for i in range(days_ahead)],
-                "trend_direction": "stable",
-                "confidence_interval": [[max(0, avg_daily * 0.8), avg_daily * 1.2]] * days_ahead
-            }
+        # One slot per calendar day from the first to the last date; days with
+        # no variants stay 0
+        days_since_start = (dates - dates[0]).astype(np.int64)
+        y = np.bincount(days_since_start, weights=counts)
+        X = np.arange(y.size)
         
-        try:
-            from sklearn.linear_model import LinearRegression
-            model = LinearRegression()
-            model.fit(X, y)
-        except ImportError:
-            return {"error": "scikit-learn is required. Install with: pip install scikit-learn"}
+        # Ordinary least squares on one regressor, closed form
+        slope, intercept = np.polyfit(X, y, 1)
         
-        future_dates = pd.date_range(start=daily_counts['date'].max() + timedelta(days=1),
-                                   periods=days_ahead)
-        future_days = np.arange(len(daily_counts), len(daily_counts) + days_ahead).reshape(-1, 1)
+        future_dates = dates[-1] + np.arange(1, days_ahead + 1)
+        future_days = np.arange(y.size, y.size + days_ahead)
         
-        predictions = model.predict(future_days)
-        predictions = np.maximum(predictions, 0)
+        predictions = np.maximum(intercept + slope * future_days, 0)
         
-        slope = model.coef_[0] if len(model.coef_) > 0 else 0
         if slope > 0.1:
             trend = "increasing"
         elif slope < -0.1:
@@ -210,77 +316,70 @@ Recent Trends (last 30 days):
         
         return {
             "predicted_counts": predictions.tolist(),
-            "future_dates": [d.date().isoformat() for d in future_dates],
+            "future_dates": np.datetime_as_string(future_dates, unit='D').tolist(),
             "trend_direction": trend,
-            "confidence_interval": self._calculate_prediction_interval(predictions, daily_counts['count'].std())
+            "confidence_interval": self._calculate_prediction_interval(predictions, y.std(ddof=1))
         }
     
     def _calculate_prediction_interval(self, predictions: np.ndarray, historical_std: float) -> List[List[float]]:
-        intervals = []
-        for pred in predictions:
-            intervals.append([max(0, pred - historical_std), pred + historical_std])
-        return intervals
+        lower = np.maximum(predictions - historical_std, 0.0)
+        upper = predictions + historical_std
+        return np.stack([lower, upper], axis=1).tolist()
     
-    def _create_trend_visualizations(self, historical_data: List[Dict], predictions: Dict) -> Dict[str, Any]:
-        df = pd.DataFrame(historical_data)
-        df['date'] = pd.to_datetime(df['date'])
-        
+    def _create_trend_visualizations(self, trend_data: Dict[str, Any], predictions: Dict) -> Dict[str, Any]:
         charts = {}
         
-        daily_counts = df.groupby('date').size().reset_index(name='count')
-        
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=daily_counts['date'],
-            y=daily_counts['count'],
-            mode='lines+markers',
-            name='Historical Data',
-            line=dict(color='#000000', width=2)
-        ))
+        # Plain lists keep the charts JSON-safe; the trend chart is stored in
+        # a JSONField as well as returned
+        traces = [{
+            'type': 'scatter',
+            'x': np.datetime_as_string(trend_data['dates'], unit='D').tolist(),
+            'y': trend_data['counts'].tolist(),
+            'mode': 'lines+markers',
+            'name': 'Historical Data',
+            'line': {'color': '#000000', 'width': 2}
+        }]
         
         if 'future_dates' in predictions and 'predicted_counts' in predictions:
-            future_dates = pd.to_datetime(predictions['future_dates'])
-            fig.add_trace(go.Scatter(
-                x=future_dates,
-                y=predictions['predicted_counts'],
-                mode='lines',
-                name='Predictions',
-                line=dict(color='#ef4444', dash='dash', width=2)
-            ))
-        
-        fig.update_layout(
-            title="Cancer Variant Discovery Trends",
+            traces.append({
+                'type': 'scatter',
+                'x': predictions['future_dates'],
+                'y': predictions['predicted_counts'],
+                'mode': 'lines',
+                'name': 'Predictions',
+                'line': {'color': '#ef4444', 'dash': 'dash', 'width': 2}
+            })
+        
+        charts['trend_chart'] = _figure(
+            traces,
+            "Cancer Variant Discovery Trends",
             xaxis_title="Date",
-            yaxis_title="Number of Variants",
-            template="plotly_white",
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
+            yaxis_title="Number of Variants"
         )
         
-        charts['trend_chart'] = json.loads(json.dumps(fig, cls=PlotlyJSONEncoder))
-        
-        gene_counts = df['gene'].value_counts().head(10)
-        fig2 = px.bar(
-            x=gene_counts.index,
-            y=gene_counts.values,
-            title="Top 10 Genes by Variant Frequency",
-            labels={'x': 'Gene', 'y': 'Variant Count'}
-        )
-        fig2.update_layout(
-            template="plotly_white",
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
+        gene_freq = trend_data['gene_freq']
+        charts['gene_chart'] = _figure(
+            [{
+                'type': 'bar',
+                'x': list(gene_freq.keys()),
+                'y': list(gene_freq.values()),
+                'marker': {'color': '#636efa'},
+                'hovertemplate': 'Gene=%{x}<br>Variant Count=%{y}<extra></extra>',
+                'showlegend': False
+            }],
+            "Top 10 Genes by Variant Frequency",
+            xaxis_title="Gene",
+            yaxis_title="Variant Count"
         )
-        charts['gene_chart'] = json.loads(json.dumps(fig2, cls=PlotlyJSONEncoder))
         
         return charts
     
-    def _calculate_confidence_score(self, historical_data: List[Dict]) -> float:
-        if len(historical_data) < 14:
+    def _calculate_confidence_score(self, total_variants: int) -> float:
+        if total_variants < 14:
             return 0.3
-        elif len(historical_data) < 30:
+        elif total_variants < 30:
             return 0.6
-        elif len(historical_data) < 90:
+        elif total_variants < 90:
             return 0.8
         else:
             return 0.9
@@ -289,6 +388,14 @@ Recent Trends (last 30 days):
 class GeminiGraphGenerator(GeminiService):
     
     def generate_graph_from_data(self, data: Dict[str, Any], graph_type: str = "auto") -> Dict[str, Any]:
+        cache_key = _cache_key('graph', _dumps(
+            [data, graph_type],
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        ))
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             data_analysis = self._analyze_data_structure(data)
             
@@ -301,11 +408,13 @@ class GeminiGraphGenerator(GeminiService):
             for g_type in recommended_graphs:
                 graphs[g_type] = self._generate_specific_graph(data, g_type, data_analysis)
             
-            return {
+            result = {
                 "graphs": graphs,
                 "analysis": data_analysis,
                 "recommendations": self._generate_visualization_recommendations(data_analysis)
             }
+            cache.set(cache_key, result, settings.GEMINI_CACHE_TIMEOUT)
+            return result
             
         except Exception as e:
             logger.error(f"Error generating graph: {str(e)}")
@@ -326,58 +435,44 @@ class GeminiGraphGenerator(GeminiService):
             if isinstance(value, list) and len(value) > 0:
                 analysis["dimensions"][key] = len(value)
                 
-                sample = value[:min(5, len(value))]
+                # One conversion types the whole list and lets the range
+                # reductions run in C; ragged nested lists stay untyped
+                try:
+                    arr = np.asarray(value)
+                except ValueError:
+                    arr = None
+                kind = arr.dtype.kind if arr is not None and arr.ndim == 1 else None
                 
-                if all(isinstance(x, (int, float)) for x in sample):
+                if kind in ('i', 'u', 'f', 'b'):
                     analysis["data_types"][key] = "numerical"
                     analysis["numerical_fields"].append(key)
-                    if len(value) > 0:
-                        analysis["value_ranges"][key] = {
-                            "min": min(value),
-                            "max": max(value),
-                            "mean": sum(value) / len(value)
-                        }
-                elif all(isinstance(x, str) for x in sample):
+                    analysis["value_ranges"][key] = _json_safe({
+                        "min": arr.min(),
+                        "max": arr.max(),
+                        "mean": arr.mean()
+                    })
+                elif kind == 'U':
                     analysis["data_types"][key] = "categorical"
                     analysis["categorical_fields"].append(key)
-                elif all(isinstance(x, dict) for x in sample):
+                elif kind == 'O' and all(isinstance(x, dict) for x in value[:5]):
                     analysis["data_types"][key] = "complex"
-                    if sample:
-                        nested_keys = set()
-                        for item in sample:
-                            nested_keys.update(item.keys())
-                        analysis["relationships"].append({
-                            "field": key,
-                            "nested_fields": list(nested_keys)
-                        })
+                    nested_keys = set()
+                    for item in value[:5]:
+                        nested_keys.update(item.keys())
+                    analysis["relationships"].append({
+                        "field": key,
+                        "nested_fields": list(nested_keys)
+                    })
         
         return analysis
     
     def _recommend_graph_types(self, data_analysis: Dict[str, Any]) -> List[str]:
-        recommendations = []
-        
-        num_numerical = len(data_analysis["numerical_fields"])
-        num_categorical = len(data_analysis["categorical_fields"])
-        
-        if data_analysis["temporal_fields"]:
-            recommendations.append("line")
-        
-        if num_categorical > 0:
-            recommendations.append("bar")
-        
-        if num_categorical == 1 and num_numerical >= 1:
-            recommendations.append("pie")
-        
-        if num_numerical >= 2:
-            recommendations.append("scatter")
-        
-        if num_numerical >= 3:
-            recommendations.append("heatmap")
-        
-        if not recommendations:
-            recommendations = ["bar"]
-        
-        return recommendations[:3]
+        key = (
+            bool(data_analysis["temporal_fields"]),
+            min(len(data_analysis["categorical_fields"]), 2),
+            min(len(data_analysis["numerical_fields"]), 3)
+        )
+        return list(_RECOMMENDATION_TABLE[key])
     
     def _generate_specific_graph(self, data: Dict[str, Any], graph_type: str, analysis: Dict[str, Any]) -> Dict[str, Any]:
         if graph_type == "bar":
@@ -400,28 +495,24 @@ class GeminiGraphGenerator(GeminiService):
         if not cat_field or not num_field:
             return {"error": "Insufficient data for bar chart"}
         
-        fig = go.Figure()
-        
+        traces = []
         if isinstance(data[cat_field], list) and isinstance(data[num_field], list):
-            fig.add_trace(go.Bar(
-                x=data[cat_field],
-                y=data[num_field],
-                name=num_field.title(),
-                marker_color='#000000'
-            ))
-        
-        fig.update_layout(
-            title=f"{num_field.title()} by {cat_field.title()}",
-            xaxis_title=cat_field.title(),
-            yaxis_title=num_field.title(),
-            template="plotly_white",
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
-        )
+            traces.append({
+                'type': 'bar',
+                'x': data[cat_field],
+                'y': data[num_field],
+                'name': num_field.title(),
+                'marker': {'color': '#000000'}
+            })
         
         return {
             "type": "bar",
-            "data": json.loads(json.dumps(fig, cls=PlotlyJSONEncoder)),
+            "data": _figure(
+                traces,
+                f"{num_field.title()} by {cat_field.title()}",
+                xaxis_title=cat_field.title(),
+                yaxis_title=num_field.title()
+            ),
             "description": f"Bar chart showing {num_field} distribution across {cat_field} categories"
         }
     
@@ -441,29 +532,25 @@ class GeminiGraphGenerator(GeminiService):
         if not x_field or not y_field:
             return {"error": "Insufficient data for line chart"}
         
-        fig = go.Figure()
-        
+        traces = []
         if isinstance(data[x_field], list) and isinstance(data[y_field], list):
-            fig.add_trace(go.Scatter(
-                x=data[x_field],
-                y=data[y_field],
-                mode='lines+markers',
-                name=y_field.title(),
-                line=dict(color='#000000', width=2)
-            ))
-        
-        fig.update_layout(
-            title=f"{y_field.title()} Over Time",
-            xaxis_title=x_field.title(),
-            yaxis_title=y_field.title(),
-            template="plotly_white",
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
-        )
+            traces.append({
+                'type': 'scatter',
+                'x': data[x_field],
+                'y': data[y_field],
+                'mode': 'lines+markers',
+                'name': y_field.title(),
+                'line': {'color': '#000000', 'width': 2}
+            })
         
         return {
             "type": "line",
-            "data": json.loads(json.dumps(fig, cls=PlotlyJSONEncoder)),
+            "data": _figure(
+                traces,
+                f"{y_field.title()} Over Time",
+                xaxis_title=x_field.title(),
+                yaxis_title=y_field.title()
+            ),
             "description": f"Line chart showing {y_field} trends over {x_field}"
         }
     
@@ -474,25 +561,18 @@ class GeminiGraphGenerator(GeminiService):
         if not cat_field or not num_field:
             return {"error": "Insufficient data for pie chart"}
         
-        fig = go.Figure()
-        
+        traces = []
         if isinstance(data[cat_field], list) and isinstance(data[num_field], list):
-            fig.add_trace(go.Pie(
-                labels=data[cat_field],
-                values=data[num_field],
-                title=num_field.title()
-            ))
-        
-        fig.update_layout(
-            title=f"{num_field.title()} Distribution",
-            template="plotly_white",
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
-        )
+            traces.append({
+                'type': 'pie',
+                'labels': data[cat_field],
+                'values': data[num_field],
+                'title': {'text': num_field.title()}
+            })
         
         return {
             "type": "pie",
-            "data": json.loads(json.dumps(fig, cls=PlotlyJSONEncoder)),
+            "data": _figure(traces, f"{num_field.title()} Distribution"),
             "description": f"Pie chart showing proportional distribution of {num_field} by {cat_field}"
         }
     
@@ -503,29 +583,25 @@ class GeminiGraphGenerator(GeminiService):
         x_field = analysis["numerical_fields"][0]
         y_field = analysis["numerical_fields"][1]
         
-        fig = go.Figure()
-        
+        traces = []
         if isinstance(data[x_field], list) and isinstance(data[y_field], list):
-            fig.add_trace(go.Scatter(
-                x=data[x_field],
-                y=data[y_field],
-                mode='markers',
-                name=f"{x_field} vs {y_field}",
-                marker=dict(color='#000000', size=8)
-            ))
-        
-        fig.update_layout(
-            title=f"{y_field.title()} vs {x_field.title()}",
-            xaxis_title=x_field.title(),
-            yaxis_title=y_field.title(),
-            template="plotly_white",
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
-        )
+            traces.append({
+                'type': 'scatter',
+                'x': data[x_field],
+                'y': data[y_field],
+                'mode': 'markers',
+                'name': f"{x_field} vs {y_field}",
+                'marker': {'color': '#000000', 'size': 8}
+            })
         
         return {
             "type": "scatter",
-            "data": json.loads(json.dumps(fig, cls=PlotlyJSONEncoder)),
+            "data": _figure(
+                traces,
+                f"{y_field.title()} vs {x_field.title()}",
+                xaxis_title=x_field.title(),
+                yaxis_title=y_field.title()
+            ),
             "description": f"Scatter plot showing relationship between {x_field} and {y_field}"
         }
     
@@ -541,29 +617,31 @@ class GeminiGraphGenerator(GeminiService):
         if len(numerical_data) < 2:
             return {"error": "Insufficient numerical data for heatmap"}
         
-        df = pd.DataFrame(numerical_data)
-        correlation_matrix = df.corr()
-        
-        fig = go.Figure()
-        
-        fig.add_trace(go.Heatmap(
-            z=correlation_matrix.values,
-            x=correlation_matrix.columns,
-            y=correlation_matrix.columns,
-            colorscale='RdBu',
-            zmid=0
-        ))
-        
-        fig.update_layout(
-            title="Correlation Heatmap",
-            template="plotly_white",
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
-        )
+        # Rows are variables; corrcoef works on the 2-D array directly. A
+        # constant field has no correlation, so its row and column are NaN;
+        # JSON has no NaN, so those cells go out as null
+        labels = list(numerical_data.keys())
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation_matrix = np.corrcoef(np.asarray(list(numerical_data.values()), dtype=np.float64))
+        correlation_matrix = np.where(np.isfinite(correlation_matrix), correlation_matrix, None)
+        
+        # Plotly.js has its own, differently coloured 'RdBu', so spell out
+        # the Python palette as go.Heatmap would
+        from plotly.colors import diverging
+        colorscale = [[i / (len(diverging.RdBu) - 1), color] for i, color in enumerate(diverging.RdBu)]
+        
+        traces = [{
+            'type': 'heatmap',
+            'z': correlation_matrix.tolist(),
+            'x': labels,
+            'y': labels,
+            'colorscale': colorscale,
+            'zmid': 0
+        }]
         
         return {
             "type": "heatmap",
-            "data": json.loads(json.dumps(fig, cls=PlotlyJSONEncoder)),
+            "data": _figure(traces, "Correlation Heatmap"),
             "description": "Heatmap showing correlations between numerical variables"
         }
     
@@ -590,24 +668,30 @@ class GeminiGraphGenerator(GeminiService):
 
 _trend_predictor = None
 _graph_generator = None
+# First requests can arrive on several threads at once; build each service once
+_trend_predictor_lock = threading.Lock()
+_graph_generator_lock = threading.Lock()
 
 def get_trend_predictor():
     global _trend_predictor
     if _trend_predictor is None:
-        try:
-            _trend_predictor = GeminiTrendPredictor()
-        except Exception as e:
-            logger.error(f"Failed to initialize GeminiTrendPredictor: {str(e)}")
-            raise ValueError(f"Failed to initialize trend predictor: {str(e)}. Check GEMINI_API_KEY is set.")
+        with _trend_predictor_lock:
+            if _trend_predictor is None:
+                try:
+                    _trend_predictor = GeminiTrendPredictor()
+                except Exception as e:
+                    logger.error(f"Failed to initialize GeminiTrendPredictor: {str(e)}")
+                    raise ValueError(f"Failed to initialize trend predictor: {str(e)}. Check GEMINI_API_KEY is set.")
     return _trend_predictor
 
 def get_graph_generator():
     global _graph_generator
     if _graph_generator is None:
-        try:
-            _graph_generator = GeminiGraphGenerator()
-        except Exception as e:
-            logger.error(f"Failed to initialize GeminiGraphGenerator: {str(e)}")
-            raise ValueError(f"Failed to initialize graph generator: {str(e)}. Check GEMINI_API_KEY is set.")
+        with _graph_generator_lock:
+            if _graph_generator is None:
+                try:
+                    _graph_generator = GeminiGraphGenerator()
+                except Exception as e:
+                    logger.error(f"Failed to initialize GeminiGraphGenerator: {str(e)}")
+                    raise ValueError(f"Failed to initialize graph generator: {str(e)}. Check GEMINI_API_KEY is set.")
     return _graph_generator
-
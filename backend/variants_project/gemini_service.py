@@ -1,8 +1,18 @@
 import os
+import re
 import json
+import asyncio
+import hashlib
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+from bisect import bisect_left
+from collections import defaultdict, deque
+from concurrent.futures import Future
+from itertools import islice
+from functools import lru_cache
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 from datetime import datetime
+import orjson
 
 try:
     import google.generativeai as genai
@@ -11,72 +21,144 @@ except ImportError:
     GEMINI_AVAILABLE = False
     logging.warning("google-generativeai not installed. Install with: pip install google-generativeai")
 
+from django.conf import settings
+from django.core.cache import cache
+
 from variants.models import Variant, ClinicalSignificance, DrugResponse
 
 logger = logging.getLogger(__name__)
 
-
-class GeminiService:
+# Markdown code fence Gemini often wraps around JSON output
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_JSON_START_RE = re.compile(r"[{\[]")
+
+
+def _parse_llm_json(text: str) -> Any:
+    """
+    Parse JSON from a model response.
+    Tolerates code fences, trailing commas and prose around the JSON value;
+    raises the original decode error when nothing parses.
+    """
+    cleaned = _FENCE_RE.sub("", text).strip()
+    try:
+        return orjson.loads(cleaned)
+    except orjson.JSONDecodeError as e:
+        error = e
     
-    def __init__(self, model_name: str = "gemini-2.0-flash-exp"):
-        if not GEMINI_AVAILABLE:
-            raise ImportError("google-generativeai package is required. Install with: pip install google-generativeai")
-        
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable is required. Get your free API key from https://aistudio.google.com/app/apikey")
-        
-        model_name = os.getenv('GEMINI_MODEL', model_name)
-        
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
-        self.model_name = model_name
-        
-        logger.info(f"Initialized Gemini service with model: {model_name}")
-        
-    def generate_text(self, prompt: str, temperature: float = 0.7, max_tokens: int = 8192) -> str:
+    repaired = _TRAILING_COMMA_RE.sub(r"\1", cleaned)
+    try:
+        return orjson.loads(repaired)
+    except orjson.JSONDecodeError:
+        pass
+    
+    # First complete object or array embedded in surrounding text
+    decoder = json.JSONDecoder()
+    for match in _JSON_START_RE.finditer(repaired):
         try:
-            generation_config = {
-                "temperature": temperature,
-                "max_output_tokens": min(max_tokens, 8192),
-            }
-            
-            response = self.model.generate_content(
-                prompt,
-                generation_config=generation_config
-            )
-            
-            return response.text
-        except Exception as e:
-            logger.error(f"Error generating text with Gemini: {str(e)}")
-            if "429" in str(e) or "quota" in str(e).lower():
-                raise Exception("Rate limit exceeded. Please wait before making another request.")
-            raise
+            return decoder.raw_decode(repaired, match.start())[0]
+        except json.JSONDecodeError:
+            continue
+    raise error
 
 
-class VariantInterpreter(GeminiService):
+def _response_cache_key(model_name: str, temperature: float, max_tokens: int, prompt: str) -> str:
+    """Cache key for a generated response; identical requests map to the same entry"""
+    # Hash the prompt on its own rather than copying it into a combined string first
+    hasher = hashlib.blake2b(f"{model_name}|{temperature}|{max_tokens}|".encode(), digest_size=16)
+    hasher.update(prompt.encode())
+    return f"gemini:text:{hasher.hexdigest()}"
+
+
+# Requests currently waiting on Gemini, keyed by response cache key
+_inflight_requests: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+# Choice labels resolved once rather than through get_FOO_display() per row
+_SIGNIFICANCE_LABELS = dict(ClinicalSignificance.SIGNIFICANCE_CHOICES)
+_REVIEW_STATUS_LABELS = dict(ClinicalSignificance.REVIEW_STATUS_CHOICES)
+_RESPONSE_TYPE_LABELS = dict(DrugResponse.RESPONSE_TYPE_CHOICES)
+_EVIDENCE_LEVEL_LABELS = dict(DrugResponse.EVIDENCE_LEVEL_CHOICES)
+
+# Columns the prompt formatters read, fetched with values_list in one query
+CLINICAL_PROMPT_FIELDS = ('significance', 'review_status', 'clinvar_id', 'phenotype')
+DRUG_PROMPT_FIELDS = ('drug_name', 'response_type', 'evidence_level', 'cancer_type')
+
+Rows = Tuple[Tuple[Any, ...], ...]
+
+# Characters (about 4 per token) a clinical or drug section may take in a prompt;
+# records past it are summarized as a count instead of sent to the model
+PROMPT_SECTION_CHAR_BUDGET = 6000
+
+
+def _join_within_budget(entries: List[str], noun: str) -> str:
+    total = 0
+    for count, entry in enumerate(entries):
+        total += len(entry) + 1
+        if total > PROMPT_SECTION_CHAR_BUDGET and count > 0:
+            return "\n".join(entries[:count]) + f"\n- ... {len(entries) - count} more {noun} omitted"
+    return "\n".join(entries)
+
+
+@lru_cache(maxsize=2048)
+def _format_clinical_rows(rows: Rows) -> str:
+    if not rows:
+        return "No clinical significance data available."
     
-    def generate_variant_summary(self, variant: Variant) -> Dict[str, Any]:
-        variant_data = self._prepare_variant_data(variant)
-        
-        prompt = f"""
+    formatted = []
+    for significance, review_status, clinvar_id, phenotype in rows:
+        formatted.append(
+            f"- Significance: {_SIGNIFICANCE_LABELS.get(significance, significance)}\n"
+            f"  Review Status: {_REVIEW_STATUS_LABELS.get(review_status, review_status) if review_status else 'Unknown'}\n"
+            f"  ClinVar ID: {clinvar_id or 'N/A'}\n"
+            f"  Phenotype: {phenotype or 'N/A'}"
+        )
+    return _join_within_budget(formatted, "clinical significance records")
+
+
+@lru_cache(maxsize=2048)
+def _format_drug_rows(rows: Rows) -> str:
+    if not rows:
+        return "No drug response data available."
+    
+    formatted = []
+    for drug_name, response_type, evidence_level, cancer_type in rows:
+        formatted.append(
+            f"- Drug: {drug_name}\n"
+            f"  Response Type: {_RESPONSE_TYPE_LABELS.get(response_type, response_type)}\n"
+            f"  Evidence Level: {_EVIDENCE_LEVEL_LABELS.get(evidence_level, evidence_level)}\n"
+            f"  Cancer Type: {cancer_type or 'N/A'}"
+        )
+    return _join_within_budget(formatted, "drug response records")
+
+
+def _rows_by_variant(queryset, fields: Tuple[str, ...]) -> Dict[int, Rows]:
+    """Group related rows by variant pk, keeping the model's default ordering"""
+    grouped = defaultdict(list)
+    for variant_pk, *row in queryset.values_list('variant_id', *fields):
+        grouped[variant_pk].append(tuple(row))
+    return {variant_pk: tuple(rows) for variant_pk, rows in grouped.items()}
+
+# Prompt templates, filled with str.format at call time
+
+VARIANT_SUMMARY_PROMPT = """
 You are a genetic counselor and variant interpretation expert. Analyze the following genetic variant data and provide a comprehensive, accurate summary.
 
 Variant Information:
-- Chromosome: {variant.chromosome}
-- Position: {variant.position}
-- Reference Allele: {variant.reference_allele}
-- Alternate Allele: {variant.alternate_allele}
-- Gene Symbol: {variant.gene_symbol or 'Unknown'}
-- Consequence: {variant.consequence or 'Unknown'}
-- Impact: {variant.impact or 'Unknown'}
-- gnomAD Frequency: {variant.gnomad_af if variant.gnomad_af else 'Not available'}
+- Chromosome: {chromosome}
+- Position: {position}
+- Reference Allele: {reference_allele}
+- Alternate Allele: {alternate_allele}
+- Gene Symbol: {gene_symbol}
+- Consequence: {consequence}
+- Impact: {impact}
+- gnomAD Frequency: {gnomad_af}
 
 Clinical Significance:
-{self._format_clinical_significance(variant)}
+{clinical_significance}
 
 Drug Responses:
-{self._format_drug_responses(variant)}
+{drug_responses}
 
 Please provide:
 1. A clear, concise summary of what this variant is
@@ -97,52 +179,15 @@ Format your response as JSON with these keys:
 
 Be accurate, evidence-based, and use accessible language while maintaining scientific accuracy.
 """
-        
-        try:
-            response_text = self.generate_text(prompt, temperature=0.3)
-            
-            try:
-                result = json.loads(response_text)
-            except json.JSONDecodeError:
-                result = {
-                    "summary": response_text[:500],
-                    "functional_impact": "See full explanation",
-                    "clinical_interpretation": "See full explanation",
-                    "population_context": "See full explanation",
-                    "drug_implications": "See full explanation",
-                    "key_points": response_text.split('\n')[:5],
-                    "confidence_level": "medium",
-                    "raw_response": response_text
-                }
-            
-            return {
-                "variant_id": variant.variant_id,
-                "generated_at": datetime.now().isoformat(),
-                "interpretation": result
-            }
-            
-        except Exception as e:
-            logger.error(f"Error generating variant summary: {str(e)}")
-            return {
-                "variant_id": variant.variant_id,
-                "error": str(e),
-                "generated_at": datetime.now().isoformat()
-            }
-    
-    def explain_clinical_significance(self, variant: Variant) -> str:
-        clinical_data = variant.clinical_significance.all()
-        
-        if not clinical_data.exists():
-            return "No clinical significance data available for this variant."
-        
-        prompt = f"""
+
+CLINICAL_EXPLANATION_PROMPT = """
 Explain the clinical significance of this variant in plain language for healthcare providers:
 
-Variant: {variant.chromosome}:{variant.position} {variant.reference_allele}>{variant.alternate_allele}
-Gene: {variant.gene_symbol or 'Unknown'}
+Variant: {chromosome}:{position} {reference_allele}>{alternate_allele}
+Gene: {gene_symbol}
 
 Clinical Significance Records:
-{self._format_clinical_significance(variant)}
+{clinical_significance}
 
 Provide:
 1. What the clinical significance means
@@ -152,25 +197,18 @@ Provide:
 
 Use clear, professional language suitable for clinicians.
 """
-        
-        try:
-            return self.generate_text(prompt, temperature=0.2)
-        except Exception as e:
-            logger.error(f"Error explaining clinical significance: {str(e)}")
-            return f"Unable to generate explanation: {str(e)}"
-    
-    def generate_patient_friendly_summary(self, variant: Variant) -> Dict[str, str]:
-        prompt = f"""
+
+PATIENT_SUMMARY_PROMPT = """
 You are a genetic counselor explaining a genetic variant to a patient in simple, empathetic language.
 
 Variant Information:
-- Location: Chromosome {variant.chromosome}, position {variant.position}
-- Change: {variant.reference_allele} changed to {variant.alternate_allele}
-- Gene: {variant.gene_symbol or 'Unknown'}
-- Impact: {variant.impact or 'Unknown'}
+- Location: Chromosome {chromosome}, position {position}
+- Change: {reference_allele} changed to {alternate_allele}
+- Gene: {gene_symbol}
+- Impact: {impact}
 
 Clinical Significance:
-{self._format_clinical_significance(variant)}
+{clinical_significance}
 
 Create a patient-friendly explanation that:
 1. Uses simple language (avoid jargon)
@@ -185,12 +223,528 @@ Format as JSON with:
 - next_steps: Suggested next steps
 - questions_to_ask: 3-5 questions the patient might want to ask their doctor
 """
+
+QUERY_PARSE_PROMPT = """
+You are a database query assistant for a genetic variant database.
+
+User Query: "{user_query}"
+
+Available Fields:
+{available_fields}
+
+Convert this natural language query into structured filter criteria.
+
+Common filter patterns:
+- "pathogenic variants" -> clinical_significance__significance__in: ['pathogenic', 'likely_pathogenic']
+- "BRCA genes" -> gene_symbol__in: ['BRCA1', 'BRCA2']
+- "rare variants" -> gnomad_af__lt: 0.01
+- "high impact" -> impact: 'HIGH'
+- "drug targets" -> drug_responses__isnull: False
+
+Return JSON with this structure:
+{{
+    "filters": {{
+        "field_name": {{
+            "operator": "exact|contains|in|lt|gt|lte|gte",
+            "value": "value or array"
+        }}
+    }},
+    "search_terms": ["list of search terms"],
+    "ordering": ["field_name", "-field_name"],
+    "interpretation": "What the query means in plain language"
+}}
+
+Be precise and only include filters you're confident about.
+"""
+
+QUERY_SUGGESTION_PROMPT = """
+Suggest 5 natural language query completions for a genetic variant database search.
+
+Partial Query: "{partial_query}"
+
+Context: {context}
+
+Suggest queries that:
+1. Complete the user's thought
+2. Are commonly used in variant searches
+3. Are grammatically correct
+4. Are specific and actionable
+
+Return as JSON array of strings.
+"""
+
+CHAT_VARIANT_CONTEXT = """
+Current Variant Context:
+- Variant: {chromosome}:{position}
+- Gene: {gene_symbol}
+- Impact: {impact}
+"""
+
+CHAT_PROMPT = """
+You are a helpful assistant for a genetic variant analysis platform. Answer questions about genetic variants, their clinical significance, and related topics.
+
+{context_prompt}
+
+{history_text}
+
+User Question: {message}
+
+Provide a helpful, accurate answer. If you're unsure, say so. If the question requires specific variant data that isn't in context, ask for clarification.
+
+Answer:
+"""
+
+LITERATURE_CONTEXT_PROMPT = """
+You are a genomics researcher. Provide literature-based context for this variant:
+
+Variant: {chromosome}:{position} {reference_allele}>{alternate_allele}
+Gene: {gene_symbol}
+Consequence: {consequence}
+
+Provide:
+1. Known associations with this variant/gene
+2. Relevant research findings
+3. Pathway involvement
+4. Disease associations
+5. Research gaps or areas needing more study
+
+Format as JSON with:
+- associations: Array of known associations
+- research_findings: Array of key research findings
+- pathways: Array of biological pathways involved
+- disease_associations: Array of disease associations
+- research_gaps: Array of areas needing more research
+- summary: Brief summary paragraph
+"""
+
+PATHWAY_ANALYSIS_PROMPT = """
+Analyze the role of this variant in biological pathways:
+
+Variant: {chromosome}:{position}
+Gene: {gene_symbol}
+Consequence: {consequence}
+
+Explain:
+1. Which biological pathways this gene/variant affects
+2. How the variant impacts pathway function
+3. Downstream effects
+4. Therapeutic implications
+
+Provide a clear, scientific explanation.
+"""
+
+
+def _variant_prompt_fields(variant: Variant) -> Dict[str, Any]:
+    """Variant attributes as substituted into the prompt templates"""
+    return {
+        "chromosome": variant.chromosome,
+        "position": variant.position,
+        "reference_allele": variant.reference_allele,
+        "alternate_allele": variant.alternate_allele,
+        "gene_symbol": variant.gene_symbol or 'Unknown',
+        "consequence": variant.consequence or 'Unknown',
+        "impact": variant.impact or 'Unknown',
+        "gnomad_af": variant.gnomad_af if variant.gnomad_af else 'Not available',
+    }
+
+
+# Phrases from the "Common filter patterns" in QUERY_PARSE_PROMPT, matched in
+# one scan so queries made only of them skip the Gemini round trip
+_COMMON_QUERY_RE = re.compile(
+    r"\b(?:"
+    r"(?P<pathogenic>(?:likely\s+)?pathogenic)"
+    r"|(?P<brca1>brca1)|(?P<brca2>brca2)|(?P<brca>brca)"
+    r"|(?P<rare>rare)"
+    r"|(?P<high_impact>high[\s-]+impact)"
+    r"|(?P<drug_target>drug[\s-]*targets?|druggable)"
+    r")\b",
+    re.IGNORECASE
+)
+_COMMON_QUERY_FILTERS = {
+    "pathogenic": ("clinical_significance__significance", "in", ['pathogenic', 'likely_pathogenic'],
+                   "pathogenic or likely pathogenic"),
+    "brca": ("gene_symbol", "in", ['BRCA1', 'BRCA2'], "gene BRCA1 or BRCA2"),
+    "brca1": ("gene_symbol", "exact", 'BRCA1', "gene BRCA1"),
+    "brca2": ("gene_symbol", "exact", 'BRCA2', "gene BRCA2"),
+    "rare": ("gnomad_af", "lt", 0.01, "rare (gnomAD frequency below 1%)"),
+    "high_impact": ("impact", "exact", 'HIGH', "high impact"),
+    "drug_target": ("drug_responses__isnull", "exact", False, "with drug response data"),
+}
+# Words that may surround the common phrases without changing the query's meaning
+_QUERY_FILLER_WORDS = frozenset({
+    'a', 'all', 'an', 'and', 'any', 'are', 'display', 'find', 'for', 'gene', 'genes', 'get',
+    'give', 'in', 'is', 'list', 'me', 'mutation', 'mutations', 'of', 'on', 'please', 'search',
+    'show', 'that', 'the', 'variant', 'variants', 'which', 'with',
+})
+
+
+# Frequent searches offered as completions before asking Gemini for suggestions
+COMMON_QUERIES = (
+    "pathogenic variants",
+    "pathogenic variants in BRCA1",
+    "pathogenic variants in BRCA2",
+    "pathogenic variants in TP53",
+    "pathogenic variants with drug responses",
+    "pathogenic high impact variants",
+    "likely pathogenic variants",
+    "likely pathogenic variants in BRCA genes",
+    "benign variants",
+    "variants of uncertain significance",
+    "variants with conflicting interpretations",
+    "rare variants",
+    "rare pathogenic variants",
+    "rare high impact variants",
+    "rare variants in BRCA1",
+    "high impact variants",
+    "high impact variants in TP53",
+    "high impact variants on chromosome 17",
+    "moderate impact variants",
+    "low impact variants",
+    "missense variants",
+    "missense variants in TP53",
+    "frameshift variants",
+    "stop gained variants",
+    "splice site variants",
+    "BRCA1 variants",
+    "BRCA1 pathogenic variants",
+    "BRCA2 variants",
+    "BRCA2 pathogenic variants",
+    "BRCA genes",
+    "TP53 variants",
+    "EGFR variants",
+    "EGFR variants with drug sensitivity",
+    "KRAS variants",
+    "drug targets",
+    "drug targets in EGFR",
+    "drug resistance variants",
+    "drug sensitivity variants",
+    "variants on chromosome 17",
+    "variants on chromosome 13",
+    "variants with drug responses",
+    "variants with high quality scores",
+    "show pathogenic variants",
+    "show rare variants",
+    "show drug targets",
+)
+# Sorted lowercase keys: every completion of a prefix is one contiguous run
+_COMMON_QUERY_INDEX = sorted((query.lower(), query) for query in COMMON_QUERIES)
+_COMMON_QUERY_KEYS = [key for key, _ in _COMMON_QUERY_INDEX]
+
+
+def _complete_common_query(partial_query: str, limit: int = 5) -> List[str]:
+    prefix = " ".join(partial_query.lower().split())
+    start = bisect_left(_COMMON_QUERY_KEYS, prefix)
+    completions = []
+    for key, query in _COMMON_QUERY_INDEX[start:start + limit]:
+        if not key.startswith(prefix):
+            break
+        completions.append(query)
+    return completions
+
+def _match_common_query(user_query: str, available_fields: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Resolve a query built only from common filter phrases without calling Gemini.
+    Returns None when anything else is in the query, so it goes to the model.
+    """
+    filters = {}
+    descriptions = []
+    for match in _COMMON_QUERY_RE.finditer(user_query):
+        field, operator, value, description = _COMMON_QUERY_FILTERS[match.lastgroup]
+        if field in filters and filters[field]["value"] != value:
+            return None
+        filters[field] = {"operator": operator, "value": value}
+        descriptions.append(description)
+    
+    if not filters:
+        return None
+    
+    leftover = _COMMON_QUERY_RE.sub(" ", user_query).lower()
+    if any(word not in _QUERY_FILLER_WORDS for word in re.findall(r"[a-z0-9]+", leftover)):
+        return None
+    
+    allowed_roots = {name.split('__')[0] for name in available_fields}
+    if any(field.split('__')[0] not in allowed_roots for field in filters):
+        return None
+    
+    return {
+        "filters": filters,
+        "search_terms": [],
+        "ordering": [],
+        "interpretation": f"Variants filtered by: {'; '.join(dict.fromkeys(descriptions))}"
+    }
+
+
+class GeminiService:
+    
+    def __init__(self, model_name: str = "gemini-2.0-flash-exp"):
+        if not GEMINI_AVAILABLE:
+            raise ImportError("google-generativeai package is required. Install with: pip install google-generativeai")
+        
+        api_key = os.getenv('GEMINI_API_KEY')
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY environment variable is required. Get your free API key from https://aistudio.google.com/app/apikey")
+        
+        model_name = os.getenv('GEMINI_MODEL', model_name)
+        
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+        self.model_name = model_name
+        
+        logger.info(f"Initialized Gemini service with model: {model_name}")
+        
+    def generate_text(self, prompt: str, temperature: float = 0.7, max_tokens: int = 8192,
+                      cache_response: bool = True) -> str:
+        """
+        Generate a response, reusing the cached one for an identical request.
+        
+        Pass cache_response=False where each call should draw a fresh sample
+        (chat answers): the response is then neither cached nor shared with
+        an identical request in flight.
+        """
+        max_tokens = min(max_tokens, 8192)
+        if not cache_response:
+            return self._generate_content(prompt, temperature, max_tokens)
+        
+        cache_key = _response_cache_key(self.model_name, temperature, max_tokens, prompt)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Identical requests arriving before the first one is cached wait for its result
+        with _inflight_lock:
+            future = _inflight_requests.get(cache_key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                _inflight_requests[cache_key] = future
+        if not is_leader:
+            return future.result()
+        
+        try:
+            text = self._generate_content(prompt, temperature, max_tokens)
+            cache.set(cache_key, text, settings.GEMINI_CACHE_TIMEOUT)
+            future.set_result(text)
+            return text
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _inflight_lock:
+                _inflight_requests.pop(cache_key, None)
+    
+    def _generate_content(self, prompt: str, temperature: float, max_tokens: int) -> str:
+        """One Gemini request, with quota errors reported as a rate limit"""
+        try:
+            generation_config = {
+                "temperature": temperature,
+                "max_output_tokens": max_tokens,
+            }
+            
+            response = self.model.generate_content(
+                prompt,
+                generation_config=generation_config
+            )
+            return response.text
+        except Exception as e:
+            logger.error(f"Error generating text with Gemini: {str(e)}")
+            if "429" in str(e) or "quota" in str(e).lower():
+                raise Exception("Rate limit exceeded. Please wait before making another request.")
+            raise
+    
+    def generate_text_stream(self, prompt: str, temperature: float = 0.7, max_tokens: int = 8192,
+                             cache_response: bool = True) -> Iterator[str]:
+        """
+        Yield response text as Gemini produces it; the full text is cached
+        once complete unless cache_response is False (see generate_text)
+        """
+        max_tokens = min(max_tokens, 8192)
+        cache_key = _response_cache_key(self.model_name, temperature, max_tokens, prompt)
+        if cache_response:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        chunks = []
+        try:
+            generation_config = {
+                "temperature": temperature,
+                "max_output_tokens": max_tokens,
+            }
+            
+            response = self.model.generate_content(
+                prompt,
+                generation_config=generation_config,
+                stream=True
+            )
+            for chunk in response:
+                text = chunk.text
+                chunks.append(text)
+                yield text
+        except Exception as e:
+            logger.error(f"Error streaming text from Gemini: {str(e)}")
+            if "429" in str(e) or "quota" in str(e).lower():
+                raise Exception("Rate limit exceeded. Please wait before making another request.")
+            raise
+        
+        if cache_response:
+            cache.set(cache_key, "".join(chunks), settings.GEMINI_CACHE_TIMEOUT)
+    
+    async def generate_text_async(self, prompt: str, temperature: float = 0.7, max_tokens: int = 8192,
+                                  model: Optional[Any] = None) -> str:
+        """
+        Async generate_text. The model's async client binds to the event loop
+        of its first call, so callers running their own loop pass a model
+        created for that loop.
+        """
+        max_tokens = min(max_tokens, 8192)
+        model = model or self.model
+        cache_key = _response_cache_key(self.model_name, temperature, max_tokens, prompt)
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            return cached
+        
+        try:
+            generation_config = {
+                "temperature": temperature,
+                "max_output_tokens": max_tokens,
+            }
+            
+            response = await model.generate_content_async(
+                prompt,
+                generation_config=generation_config
+            )
+            text = response.text
+        except Exception as e:
+            logger.error(f"Error generating text with Gemini: {str(e)}")
+            if "429" in str(e) or "quota" in str(e).lower():
+                raise Exception("Rate limit exceeded. Please wait before making another request.")
+            raise
+        
+        await cache.aset(cache_key, text, settings.GEMINI_CACHE_TIMEOUT)
+        return text
+    
+    async def _generate_many_async(self, prompts: List[str], temperature: float, max_concurrency: int) -> List[Any]:
+        """Run prompts concurrently; failures are returned in place of the text"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        # Each asyncio.run gets a new loop; a model shared across runs would
+        # keep an async client bound to the first, closed one
+        model = genai.GenerativeModel(self.model_name)
+        
+        async def generate_one(prompt: str) -> str:
+            async with semaphore:
+                return await self.generate_text_async(prompt, temperature=temperature, model=model)
+        
+        return await asyncio.gather(
+            *(generate_one(prompt) for prompt in prompts),
+            return_exceptions=True
+        )
+
+
+class VariantInterpreter(GeminiService):
+    
+    def generate_variant_summary(self, variant: Variant) -> Dict[str, Any]:
+        try:
+            response_text = self.generate_text(self._variant_summary_prompt(variant), temperature=0.3)
+            return self._variant_summary_result(variant, response_text)
+        except Exception as e:
+            logger.error(f"Error generating variant summary: {str(e)}")
+            return {
+                "variant_id": variant.variant_id,
+                "error": str(e),
+                "generated_at": datetime.now().isoformat()
+            }
+    
+    def batch_summaries(self, variants: List[Variant], max_concurrency: int = 8) -> List[Dict[str, Any]]:
+        """Summarize several variants with concurrent Gemini requests, in input order"""
+        # Prompts read related rows through the ORM, which must stay outside the event loop
+        clinical = _rows_by_variant(
+            ClinicalSignificance.objects.filter(variant__in=variants), CLINICAL_PROMPT_FIELDS
+        )
+        drugs = _rows_by_variant(
+            DrugResponse.objects.filter(variant__in=variants), DRUG_PROMPT_FIELDS
+        )
+        prompts = [
+            self._variant_summary_prompt(variant, clinical.get(variant.pk, ()), drugs.get(variant.pk, ()))
+            for variant in variants
+        ]
+        responses = asyncio.run(self._generate_many_async(prompts, 0.3, max_concurrency))
+        
+        results = []
+        for variant, response in zip(variants, responses):
+            if isinstance(response, Exception):
+                logger.error(f"Error generating variant summary: {str(response)}")
+                results.append({
+                    "variant_id": variant.variant_id,
+                    "error": str(response),
+                    "generated_at": datetime.now().isoformat()
+                })
+            else:
+                results.append(self._variant_summary_result(variant, response))
+        return results
+    
+    def _variant_summary_prompt(self, variant: Variant, clinical_rows: Optional[Rows] = None,
+                                drug_rows: Optional[Rows] = None) -> str:
+        if clinical_rows is None:
+            clinical_rows = self._clinical_rows(variant)
+        if drug_rows is None:
+            drug_rows = self._drug_rows(variant)
+        
+        return VARIANT_SUMMARY_PROMPT.format(
+            **_variant_prompt_fields(variant),
+            clinical_significance=_format_clinical_rows(clinical_rows),
+            drug_responses=_format_drug_rows(drug_rows)
+        )
+    
+    def _variant_summary_result(self, variant: Variant, response_text: str) -> Dict[str, Any]:
+        try:
+            result = _parse_llm_json(response_text)
+        except orjson.JSONDecodeError:
+            result = {
+                "summary": response_text[:500],
+                "functional_impact": "See full explanation",
+                "clinical_interpretation": "See full explanation",
+                "population_context": "See full explanation",
+                "drug_implications": "See full explanation",
+                "key_points": response_text.split('\n')[:5],
+                "confidence_level": "medium",
+                "raw_response": response_text
+            }
+        
+        return {
+            "variant_id": variant.variant_id,
+            "generated_at": datetime.now().isoformat(),
+            "interpretation": result
+        }
+    
+    def explain_clinical_significance(self, variant: Variant) -> str:
+        clinical_rows = self._clinical_rows(variant)
+        
+        if not clinical_rows:
+            return "No clinical significance data available for this variant."
+        
+        prompt = CLINICAL_EXPLANATION_PROMPT.format(
+            **_variant_prompt_fields(variant),
+            clinical_significance=_format_clinical_rows(clinical_rows)
+        )
+        
+        try:
+            return self.generate_text(prompt, temperature=0.2)
+        except Exception as e:
+            logger.error(f"Error explaining clinical significance: {str(e)}")
+            return f"Unable to generate explanation: {str(e)}"
+    
+    def generate_patient_friendly_summary(self, variant: Variant) -> Dict[str, str]:
+        prompt = PATIENT_SUMMARY_PROMPT.format(
+            **_variant_prompt_fields(variant),
+            clinical_significance=self._format_clinical_significance(variant)
+        )
         
         try:
             response_text = self.generate_text(prompt, temperature=0.4)
             try:
-                return json.loads(response_text)
-            except json.JSONDecodeError:
+                return _parse_llm_json(response_text)
+            except orjson.JSONDecodeError:
                 return {
                     "simple_explanation": response_text,
                     "what_it_means": "Please consult with your healthcare provider",
@@ -216,76 +770,34 @@ Format as JSON with:
             "gnomad_af": variant.gnomad_af,
         }
     
+    def _clinical_rows(self, variant: Variant) -> Rows:
+        return tuple(variant.clinical_significance.values_list(*CLINICAL_PROMPT_FIELDS))
+    
+    def _drug_rows(self, variant: Variant) -> Rows:
+        return tuple(variant.drug_responses.values_list(*DRUG_PROMPT_FIELDS))
+    
     def _format_clinical_significance(self, variant: Variant) -> str:
-        clinical_data = variant.clinical_significance.all()
-        if not clinical_data.exists():
-            return "No clinical significance data available."
-        
-        formatted = []
-        for cs in clinical_data:
-            formatted.append(
-                f"- Significance: {cs.get_significance_display()}\n"
-                f"  Review Status: {cs.get_review_status_display() if cs.review_status else 'Unknown'}\n"
-                f"  ClinVar ID: {cs.clinvar_id or 'N/A'}\n"
-                f"  Phenotype: {cs.phenotype or 'N/A'}"
-            )
-        return "\n".join(formatted)
+        return _format_clinical_rows(self._clinical_rows(variant))
     
     def _format_drug_responses(self, variant: Variant) -> str:
-        drug_responses = variant.drug_responses.all()
-        if not drug_responses.exists():
-            return "No drug response data available."
-        
-        formatted = []
-        for dr in drug_responses:
-            formatted.append(
-                f"- Drug: {dr.drug_name}\n"
-                f"  Response Type: {dr.get_response_type_display()}\n"
-                f"  Evidence Level: {dr.get_evidence_level_display()}\n"
-                f"  Cancer Type: {dr.cancer_type or 'N/A'}"
-            )
-        return "\n".join(formatted)
+        return _format_drug_rows(self._drug_rows(variant))
 
 
 class NaturalLanguageQueryProcessor(GeminiService):
     
     def process_query(self, user_query: str, available_fields: List[str]) -> Dict[str, Any]:
-        prompt = f"""
-You are a database query assistant for a genetic variant database.
-
-User Query: "{user_query}"
-
-Available Fields:
-{json.dumps(available_fields, indent=2)}
-
-Convert this natural language query into structured filter criteria.
-
-Common filter patterns:
-- "pathogenic variants" -> clinical_significance__significance__in: ['pathogenic', 'likely_pathogenic']
-- "BRCA genes" -> gene_symbol__in: ['BRCA1', 'BRCA2']
-- "rare variants" -> gnomad_af__lt: 0.01
-- "high impact" -> impact: 'HIGH'
-- "drug targets" -> drug_responses__isnull: False
-
-Return JSON with this structure:
-{{
-    "filters": {{
-        "field_name": {{
-            "operator": "exact|contains|in|lt|gt|lte|gte",
-            "value": "value or array"
-        }}
-    }},
-    "search_terms": ["list of search terms"],
-    "ordering": ["field_name", "-field_name"],
-    "interpretation": "What the query means in plain language"
-}}
-
-Be precise and only include filters you're confident about.
-"""
+        local_result = _match_common_query(user_query, available_fields)
+        if local_result is not None:
+            return local_result
+        
+        prompt = QUERY_PARSE_PROMPT.format(
+            user_query=user_query,
+            available_fields=orjson.dumps(available_fields, option=orjson.OPT_INDENT_2).decode()
+        )
         
         try:
             response_text = self.generate_text(prompt, temperature=0.1)
-            result = json.loads(response_text)
+            result = _parse_llm_json(response_text)
             return result
         except Exception as e:
             logger.error(f"Error processing natural language query: {str(e)}")
@@ -297,138 +809,100 @@ Be precise and only include filters you're confident about.
             }
     
     def suggest_queries(self, partial_query: str, context: Dict[str, Any] = None) -> List[str]:
-        prompt = f"""
-Suggest 5 natural language query completions for a genetic variant database search.
-
-Partial Query: "{partial_query}"
-
-Context: {json.dumps(context or {}, indent=2)}
-
-Suggest queries that:
-1. Complete the user's thought
-2. Are commonly used in variant searches
-3. Are grammatically correct
-4. Are specific and actionable
-
-Return as JSON array of strings.
-"""
+        suggestions = _complete_common_query(partial_query)
+        if len(suggestions) >= 5:
+            return suggestions
+        
+        prompt = QUERY_SUGGESTION_PROMPT.format(
+            partial_query=partial_query,
+            context=orjson.dumps(context or {}, option=orjson.OPT_INDENT_2).decode()
+        )
         
         try:
             response_text = self.generate_text(prompt, temperature=0.5)
-            suggestions = json.loads(response_text)
-            if isinstance(suggestions, list):
-                return suggestions[:5]
-            return []
+            generated = _parse_llm_json(response_text)
+            if isinstance(generated, list):
+                suggestions += [suggestion for suggestion in generated if suggestion not in suggestions]
+            return suggestions[:5]
         except Exception as e:
             logger.error(f"Error generating query suggestions: {str(e)}")
-            return []
+            return suggestions
 
 
 class VariantChatAssistant(GeminiService):
     
     def __init__(self, model_name: str = "gemini-2.0-flash-exp"):
         super().__init__(model_name)
-        self.conversation_history = []
+        # Bounded: appending past maxlen drops the oldest turn
+        self.conversation_history = deque(maxlen=10)
     
     def chat(self, message: str, variant_context: Optional[Variant] = None) -> str:
-        context_prompt = ""
-        if variant_context:
-            context_prompt = f"""
-Current Variant Context:
-- Variant: {variant_context.chromosome}:{variant_context.position}
-- Gene: {variant_context.gene_symbol or 'Unknown'}
-- Impact: {variant_context.impact or 'Unknown'}
-"""
-        
-        history_text = ""
-        if self.conversation_history:
-            history_text = "\nPrevious conversation:\n"
-            for entry in self.conversation_history[-5:]:
-                history_text += f"User: {entry['user']}\nAssistant: {entry['assistant']}\n"
-        
-        prompt = f"""
-You are a helpful assistant for a genetic variant analysis platform. Answer questions about genetic variants, their clinical significance, and related topics.
-
-{context_prompt}
-
-{history_text}
-
-User Question: {message}
-
-Provide a helpful, accurate answer. If you're unsure, say so. If the question requires specific variant data that isn't in context, ask for clarification.
-
-Answer:
-"""
+        prompt = self._chat_prompt(message, variant_context)
         
         try:
-            response = self.generate_text(prompt, temperature=0.7)
+            # Sampled at 0.7 so a repeated question can get a different answer
+            response = self.generate_text(prompt, temperature=0.7, cache_response=False)
             
             self.conversation_history.append({
                 "user": message,
                 "assistant": response
             })
             
-            if len(self.conversation_history) > 10:
-                self.conversation_history = self.conversation_history[-10:]
-            
             return response
         except Exception as e:
             logger.error(f"Error in chat assistant: {str(e)}")
             return f"I apologize, but I encountered an error: {str(e)}"
     
+    def chat_stream(self, message: str, variant_context: Optional[Variant] = None) -> Iterator[str]:
+        """Like chat(), but yields the answer in chunks; history is updated once it completes"""
+        prompt = self._chat_prompt(message, variant_context)
+        
+        chunks = []
+        for chunk in self.generate_text_stream(prompt, temperature=0.7, cache_response=False):
+            chunks.append(chunk)
+            yield chunk
+        
+        self.conversation_history.append({
+            "user": message,
+            "assistant": "".join(chunks)
+        })
+    
+    def _chat_prompt(self, message: str, variant_context: Optional[Variant]) -> str:
+        context_prompt = ""
+        if variant_context:
+            context_prompt = CHAT_VARIANT_CONTEXT.format(**_variant_prompt_fields(variant_context))
+        
+        history_text = ""
+        if self.conversation_history:
+            recent = islice(self.conversation_history, max(len(self.conversation_history) - 5, 0), None)
+            history_text = "\nPrevious conversation:\n" + "".join(
+                f"User: {entry['user']}\nAssistant: {entry['assistant']}\n" for entry in recent
+            )
+        
+        return CHAT_PROMPT.format(
+            context_prompt=context_prompt,
+            history_text=history_text,
+            message=message
+        )
+    
     def reset_conversation(self):
-        self.conversation_history = []
+        self.conversation_history.clear()
 
 
 class AnnotationEnhancer(GeminiService):
     
     def enhance_with_literature_context(self, variant: Variant) -> Dict[str, Any]:
-        prompt = f"""
-You are a genomics researcher. Provide literature-based context for this variant:
-
-Variant: {variant.chromosome}:{variant.position} {variant.reference_allele}>{variant.alternate_allele}
-Gene: {variant.gene_symbol or 'Unknown'}
-Consequence: {variant.consequence or 'Unknown'}
-
-Provide:
-1. Known associations with this variant/gene
-2. Relevant research findings
-3. Pathway involvement
-4. Disease associations
-5. Research gaps or areas needing more study
-
-Format as JSON with:
-- associations: Array of known associations
-- research_findings: Array of key research findings
-- pathways: Array of biological pathways involved
-- disease_associations: Array of disease associations
-- research_gaps: Array of areas needing more research
-- summary: Brief summary paragraph
-"""
+        prompt = LITERATURE_CONTEXT_PROMPT.format(**_variant_prompt_fields(variant))
         
         try:
             response_text = self.generate_text(prompt, temperature=0.3)
-            return json.loads(response_text)
+            return _parse_llm_json(response_text)
         except Exception as e:
             logger.error(f"Error enhancing annotations: {str(e)}")
             return {"error": str(e)}
     
     def generate_pathway_analysis(self, variant: Variant) -> str:
-        prompt = f"""
-Analyze the role of this variant in biological pathways:
-
-Variant: {variant.chromosome}:{variant.position}
-Gene: {variant.gene_symbol or 'Unknown'}
-Consequence: {variant.consequence or 'Unknown'}
-
-Explain:
-1. Which biological pathways this gene/variant affects
-2. How the variant impacts pathway function
-3. Downstream effects
-4. Therapeutic implications
-
-Provide a clear, scientific explanation.
-"""
+        prompt = PATHWAY_ANALYSIS_PROMPT.format(**_variant_prompt_fields(variant))
         
         try:
             return self.generate_text(prompt, temperature=0.3)
@@ -441,31 +915,44 @@ variant_interpreter = None
 query_processor = None
 chat_assistant = None
 annotation_enhancer = None
+# Concurrent first requests must not each build a service and rerun genai.configure
+_variant_interpreter_lock = threading.Lock()
+_query_processor_lock = threading.Lock()
+_chat_assistant_lock = threading.Lock()
+_annotation_enhancer_lock = threading.Lock()
 
 
 def get_variant_interpreter() -> VariantInterpreter:
     global variant_interpreter
     if variant_interpreter is None:
-        variant_interpreter = VariantInterpreter()
+        with _variant_interpreter_lock:
+            if variant_interpreter is None:
+                variant_interpreter = VariantInterpreter()
     return variant_interpreter
 
 
 def get_query_processor() -> NaturalLanguageQueryProcessor:
     global query_processor
     if query_processor is None:
-        query_processor = NaturalLanguageQueryProcessor()
+        with _query_processor_lock:
+            if query_processor is None:
+                query_processor = NaturalLanguageQueryProcessor()
     return query_processor
 
 
 def get_chat_assistant() -> VariantChatAssistant:
     global chat_assistant
     if chat_assistant is None:
-        chat_assistant = VariantChatAssistant()
+        with _chat_assistant_lock:
+            if chat_assistant is None:
+                chat_assistant = VariantChatAssistant()
     return chat_assistant
 
 
 def get_annotation_enhancer() -> AnnotationEnhancer:
     global annotation_enhancer
     if annotation_enhancer is None:
-        annotation_enhancer = AnnotationEnhancer()
+        with _annotation_enhancer_lock:
+            if annotation_enhancer is None:
+                annotation_enhancer = AnnotationEnhancer()
     return annotation_enhancer
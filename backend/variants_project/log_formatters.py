@@ -0,0 +1,17 @@
+import logging
+import orjson
+
+
+class JSONFormatter(logging.Formatter):
+    """Format log records as one compact JSON object per line"""
+    
+    def format(self, record):
+        payload = {
+            'lvl': record.levelname,
+            'ts': record.created,
+            'mod': record.module,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return orjson.dumps(payload).decode()
@@ -0,0 +1,45 @@
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+
+class QueuedFileHandler(QueueHandler):
+    """
+    File handler that hands records to a background thread for writing.
+    
+    Records are formatted on the calling thread and queued; a QueueListener
+    thread does the file I/O, so logging never blocks a request or task on
+    disk. Closing the handler (logging.shutdown at exit) drains the queue.
+    """
+    
+    def __init__(self, filename, mode='a', encoding=None):
+        # Created before the QueueHandler so logging.shutdown, which closes
+        # handlers newest first, stops the listener before closing the file
+        self.target = logging.FileHandler(filename, mode=mode, encoding=encoding)
+        super().__init__(queue.SimpleQueue())
+        self._start_listener()
+    
+    def _start_listener(self):
+        self._pid = os.getpid()
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+    
+    def emit(self, record):
+        if self._pid != os.getpid():
+            # Handler locks are re-created in a forked child, so this is safe
+            # to take there; re-check under it so only one thread restarts
+            with self.lock:
+                if self._pid != os.getpid():
+                    # Forked child (e.g. a Celery prefork worker): the listener
+                    # thread was not copied, so start a fresh queue and listener
+                    self.queue = queue.SimpleQueue()
+                    self._start_listener()
+        super().emit(record)
+    
+    def close(self):
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
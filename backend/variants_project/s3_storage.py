@@ -1,12 +1,80 @@
 import os
-import json
-from datetime import datetime
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import chain
+import gzip
 import logging
+import tempfile
+import numpy as np
+import orjson
+from botocore.exceptions import ClientError
 from variants_project.aws_config import aws_config
 
 logger = logging.getLogger(__name__)
 
+# Day prefixes listed at once by list_vcf_files_parallel; stays under the
+# client's connection pool so listings don't queue for a socket
+LIST_MAX_WORKERS = 16
+
+# Annotation results uploaded at once by upload_annotation_results_bulk
+UPLOAD_MAX_WORKERS = 16
+
+# Keys are partitioned by upload day: <prefix>/YYYY/MM/DD/<name>
+DATE_PATH_FORMAT = '%Y/%m/%d'
+
+
+def _dumps(data):
+    """Serialize a result payload straight to bytes, stringifying non-str keys as json.dumps does"""
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+# Compressed result files up to this size stay in memory; larger ones spill to disk
+RESULT_SPOOL_MAX_SIZE = 64 * 1024 * 1024
+
+# Downloaded VCFs up to this size stay in memory; larger ones spill to disk
+DOWNLOAD_SPOOL_MAX_SIZE = 64 * 1024 * 1024
+
+# Result JSON is highly repetitive; level 1 already shrinks it several-fold
+# at a speed well above upload bandwidth
+RESULT_GZIP_LEVEL = 1
+
+
+def _json_file(data):
+    """
+    Serialize a result payload as gzipped JSON into a file object ready for upload.
+    
+    A top-level list is written one item at a time, so only a single
+    encoded item is held alongside the source data rather than the whole
+    document; the transfer manager then reads the file in part-sized slices.
+    """
+    file_obj = tempfile.SpooledTemporaryFile(max_size=RESULT_SPOOL_MAX_SIZE)
+    with gzip.GzipFile(fileobj=file_obj, mode='wb', compresslevel=RESULT_GZIP_LEVEL) as gz:
+        if isinstance(data, list):
+            gz.write(b'[')
+            for index, item in enumerate(data):
+                if index:
+                    gz.write(b',')
+                gz.write(_dumps(item))
+            gz.write(b']')
+        else:
+            gz.write(_dumps(data))
+    file_obj.seek(0)
+    return file_obj
+
+
+def _result_keys(s3_key):
+    """
+    Keys to try for a stored result: the key itself, then its other form.
+    
+    Results are written gzipped under .json.gz keys; ones written before
+    that are plain JSON under .json, and callers may hold either form.
+    """
+    if s3_key.endswith('.json.gz'):
+        return [s3_key, s3_key[:-len('.gz')]]
+    if s3_key.endswith('.json'):
+        return [s3_key, f"{s3_key}.gz"]
+    return [s3_key]
+
 
 class S3VCFStorage:
     """S3 storage handler for VCF files and genomic data"""
@@ -19,10 +87,13 @@ class S3VCFStorage:
     def upload_vcf_file(file_obj, filename, metadata=None):
         """Upload VCF file to S3"""
         try:
-            key = f"{S3VCFStorage.VCF_PREFIX}/{datetime.now().strftime('%Y/%m/%d')}/{filename}"
+            # One clock read per upload so the key's date and the timestamps agree
+            now = datetime.now()
+            timestamp = now.isoformat()
+            key = f"{S3VCFStorage.VCF_PREFIX}/{now.strftime(DATE_PATH_FORMAT)}/{filename}"
             
             upload_metadata = {
-                'upload_timestamp': datetime.now().isoformat(),
+                'upload_timestamp': timestamp,
                 'original_filename': filename,
             }
             
@@ -42,7 +113,7 @@ class S3VCFStorage:
                     'key': key,
                     'url': result,
                     'filename': filename,
-                    'timestamp': datetime.now().isoformat()
+                    'timestamp': timestamp
                 }
             else:
                 logger.error(f"Failed to upload VCF: {result}")
@@ -53,13 +124,34 @@ class S3VCFStorage:
             return {'success': False, 'error': str(e)}
     
     @staticmethod
-    def download_vcf_file(s3_key):
-        """Download VCF file from S3"""
+    def download_vcf_file(s3_key, as_file=False):
+        """
+        Download VCF file from S3.
+        
+        Large objects are fetched as concurrent ranged GETs (see
+        DOWNLOAD_TRANSFER_CONFIG) into a spooled temporary file. With
+        as_file=True that file is returned rewound under 'file' for streaming
+        parsers, and the caller closes it; otherwise its bytes are returned
+        under 'data'.
+        """
         try:
-            data = aws_config.download_from_s3(s3_key)
-            if data:
-                return {'success': True, 'data': data}
-            return {'success': False, 'error': 'File not found'}
+            vcf_file = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_MAX_SIZE)
+            try:
+                aws_config.download_fileobj_parallel(s3_key, vcf_file)
+            except ClientError as e:
+                vcf_file.close()
+                if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                    return {'success': False, 'error': 'File not found'}
+                raise
+            except Exception:
+                vcf_file.close()
+                raise
+            
+            vcf_file.seek(0)
+            if as_file:
+                return {'success': True, 'file': vcf_file}
+            with vcf_file:
+                return {'success': True, 'data': vcf_file.read()}
         except Exception as e:
             logger.error(f"Error downloading VCF file: {str(e)}")
             return {'success': False, 'error': str(e)}
@@ -68,19 +160,22 @@ class S3VCFStorage:
     def upload_annotation_result(data, job_id, annotation_source):
         """Upload annotation results to S3"""
         try:
-            key = f"{S3VCFStorage.ANNOTATION_PREFIX}/{annotation_source}/{datetime.now().strftime('%Y/%m/%d')}/job_{job_id}.json"
+            now = datetime.now()
+            timestamp = now.isoformat()
+            key = f"{S3VCFStorage.ANNOTATION_PREFIX}/{annotation_source}/{now.strftime(DATE_PATH_FORMAT)}/job_{job_id}.json.gz"
             
-            file_obj = BytesIO(json.dumps(data).encode('utf-8'))
-            
-            success, result = aws_config.upload_to_s3(
-                file_obj,
-                key,
-                metadata={
-                    'job_id': str(job_id),
-                    'annotation_source': annotation_source,
-                    'timestamp': datetime.now().isoformat()
-                }
-            )
+            with _json_file(data) as file_obj:
+                success, result = aws_config.upload_to_s3(
+                    file_obj,
+                    key,
+                    metadata={
+                        'job_id': str(job_id),
+                        'annotation_source': annotation_source,
+                        'timestamp': timestamp
+                    },
+                    content_type='application/json',
+                    content_encoding='gzip'
+                )
             
             if success:
                 logger.info(f"Annotation result uploaded: {key}")
@@ -93,23 +188,71 @@ class S3VCFStorage:
             logger.error(f"Error uploading annotation result: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    @staticmethod
+    def upload_annotation_results_bulk(items):
+        """
+        Upload several annotation results to S3 concurrently.
+        
+        items is a list of (data, job_id, annotation_source) tuples; the
+        result for each is returned in the same order, in the shape
+        upload_annotation_result returns.
+        """
+        if not items:
+            return []
+        
+        with ThreadPoolExecutor(max_workers=min(UPLOAD_MAX_WORKERS, len(items))) as executor:
+            return list(executor.map(
+                lambda item: S3VCFStorage.upload_annotation_result(*item),
+                items
+            ))
+    
+    @staticmethod
+    def download_result(s3_key):
+        """
+        Download an annotation or processing result and decode its JSON.
+        
+        Objects are decompressed when gzipped, whether or not the client
+        honoured their ContentEncoding, so both new .json.gz results and
+        legacy .json ones are read; see _result_keys for the key fallback.
+        Only a missing key moves on to the next one; any other error fails.
+        """
+        try:
+            for key in _result_keys(s3_key):
+                try:
+                    response = aws_config.s3_client.get_object(Bucket=aws_config.s3_bucket, Key=key)
+                except ClientError as e:
+                    if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                        continue
+                    raise
+                body = response['Body'].read()
+                if body[:2] == b'\x1f\x8b':
+                    body = gzip.decompress(body)
+                return {'success': True, 'key': key, 'data': orjson.loads(body)}
+            return {'success': False, 'error': 'File not found'}
+        except Exception as e:
+            logger.error(f"Error downloading result: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
     @staticmethod
     def upload_processing_result(data, variant_count, processing_type):
         """Upload variant processing results to S3"""
         try:
-            key = f"{S3VCFStorage.RESULTS_PREFIX}/{processing_type}/{datetime.now().strftime('%Y/%m/%d')}/results_{variant_count}_variants.json"
-            
-            file_obj = BytesIO(json.dumps(data).encode('utf-8'))
+            now = datetime.now()
+            timestamp = now.isoformat()
+            key = f"{S3VCFStorage.RESULTS_PREFIX}/{processing_type}/{now.strftime(DATE_PATH_FORMAT)}/results_{variant_count}_variants.json.gz"
             
-            success, result = aws_config.upload_to_s3(
-                file_obj,
-                key,
-                metadata={
-                    'variant_count': str(variant_count),
-                    'processing_type': processing_type,
-                    'timestamp': datetime.now().isoformat()
-                }
-            )
+            with _json_file(data) as file_obj:
+                success, result = aws_config.upload_to_s3(
+                    file_obj,
+                    key,
+                    metadata={
+                        'variant_count': str(variant_count),
+                        'processing_type': processing_type,
+                        'timestamp': timestamp
+                    },
+                    content_type='application/json',
+                    content_encoding='gzip'
+                )
             
             if success:
                 logger.info(f"Processing result uploaded: {key}")
@@ -122,29 +265,103 @@ class S3VCFStorage:
             logger.error(f"Error uploading processing result: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    @staticmethod
+    def _iter_vcf_objects(prefix_date=None):
+        """
+        Yield raw ListObjectsV2 entries under the VCF prefix.
+        
+        ListObjectsV2 returns at most 1000 keys per call; the paginator
+        follows continuation tokens so larger prefixes are listed in full.
+        """
+        if prefix_date:
+            prefix = f"{S3VCFStorage.VCF_PREFIX}/{prefix_date}"
+        else:
+            prefix = S3VCFStorage.VCF_PREFIX
+        
+        paginator = aws_config.s3_client.get_paginator('list_objects_v2')
+        pages = paginator.paginate(
+            Bucket=aws_config.s3_bucket,
+            Prefix=prefix,
+            PaginationConfig={'PageSize': 1000}
+        )
+        
+        for page in pages:
+            yield from page.get('Contents', [])
+    
+    @staticmethod
+    def iter_vcf_files(prefix_date=None):
+        """Yield VCF files in S3, one listing page at a time"""
+        for obj in S3VCFStorage._iter_vcf_objects(prefix_date):
+            yield {
+                'key': obj['Key'],
+                'size': obj['Size'],
+                'last_modified': obj['LastModified'].isoformat(),
+                'url': aws_config.get_s3_url(obj['Key'])
+            }
+    
     @staticmethod
     def list_vcf_files(prefix_date=None):
         """List VCF files in S3"""
         try:
-            if prefix_date:
-                prefix = f"{S3VCFStorage.VCF_PREFIX}/{prefix_date}"
-            else:
-                prefix = S3VCFStorage.VCF_PREFIX
+            files = list(S3VCFStorage.iter_vcf_files(prefix_date))
+            return {'success': True, 'files': files}
+        except Exception as e:
+            logger.error(f"Error listing VCF files: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    @staticmethod
+    def list_vcf_file_arrays(prefix_date=None):
+        """
+        List VCF files in S3 as parallel arrays instead of one dict per file.
+        
+        Returns keys (object), sizes (int64 bytes) and mtimes (int64 epoch
+        seconds) aligned by index, for callers that filter or aggregate large
+        listings with numpy (e.g. files[sizes > threshold]). URLs are not
+        built here; use aws_config.get_s3_url on the keys that are kept.
+        """
+        try:
+            keys = []
+            sizes = []
+            mtimes = []
+            for obj in S3VCFStorage._iter_vcf_objects(prefix_date):
+                keys.append(obj['Key'])
+                sizes.append(obj['Size'])
+                mtimes.append(obj['LastModified'].timestamp())
             
-            response = aws_config.s3_client.list_objects_v2(
-                Bucket=aws_config.s3_bucket,
-                Prefix=prefix
-            )
+            return {
+                'success': True,
+                'keys': np.array(keys, dtype=object),
+                'sizes': np.array(sizes, dtype=np.int64),
+                'mtimes': np.array(mtimes, dtype=np.int64)
+            }
+        except Exception as e:
+            logger.error(f"Error listing VCF files: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    @staticmethod
+    def list_vcf_files_parallel(start_date, end_date):
+        """
+        List VCF files uploaded between two dates, inclusive.
+        
+        Uploads are keyed by day (VCF_PREFIX/YYYY/MM/DD/), so each day is
+        listed as its own prefix and the listings run concurrently.
+        """
+        try:
+            day_count = (end_date - start_date).days + 1
+            prefixes = [
+                (start_date + timedelta(days=offset)).strftime(DATE_PATH_FORMAT)
+                for offset in range(day_count)
+            ]
+            
+            if not prefixes:
+                return {'success': True, 'files': []}
             
-            files = []
-            if 'Contents' in response:
-                for obj in response['Contents']:
-                    files.append({
-                        'key': obj['Key'],
-                        'size': obj['Size'],
-                        'last_modified': obj['LastModified'].isoformat(),
-                        'url': aws_config.get_s3_url(obj['Key'])
-                    })
+            with ThreadPoolExecutor(max_workers=min(LIST_MAX_WORKERS, len(prefixes))) as executor:
+                listings = executor.map(
+                    lambda prefix: list(S3VCFStorage.iter_vcf_files(prefix)),
+                    prefixes
+                )
+                files = list(chain.from_iterable(listings))
             
             return {'success': True, 'files': files}
         except Exception as e:
@@ -126,6 +126,11 @@ if DB_ENGINE == 'postgresql':
             'PASSWORD': os.getenv('DB_PASSWORD', ''),
             'HOST': os.getenv('DB_HOST', 'localhost'),
             'PORT': os.getenv('DB_PORT', '5432'),
+            # Keep connections open across requests/tasks instead of reconnecting each time
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            # Named cursors don't survive PgBouncer transaction pooling
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_USE_PGBOUNCER', 'False').lower() == 'true',
         }
     }
 else:
@@ -231,6 +236,23 @@ if CELERY_ENABLED:
     CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
     CELERY_TASK_SOFT_TIME_LIMIT = 60  # 1 minute
 
+# Celery queue for the SQS polling tasks (process_*_jobs*), so they can run on
+# their own workers; unset keeps them on the default queue. The tasks mostly
+# wait on SQS and the database, so a worker for them can run many at once, e.g.
+#   celery -A variants_project worker -Q <queue> --pool=threads --concurrency=50
+CELERY_SQS_POLLING_QUEUE = os.getenv('CELERY_SQS_POLLING_QUEUE', '')
+
+if CELERY_SQS_POLLING_QUEUE:
+    CELERY_TASK_ROUTES = {
+        f'variants_project.tasks.{task_name}': {'queue': CELERY_SQS_POLLING_QUEUE}
+        for task_name in (
+            'process_annotation_jobs',
+            'process_annotation_jobs_parallel',
+            'process_sync_jobs',
+            'process_upload_jobs',
+        )
+    }
+
 # =============================================================================
 # LOGGING CONFIGURATION
 # =============================================================================
@@ -239,9 +261,8 @@ LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
-            'style': '{',
+        'json': {
+            '()': 'variants_project.log_formatters.JSONFormatter',
         },
         'simple': {
             'format': '{levelname} {message}',
@@ -251,9 +272,10 @@ LOGGING = {
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            # Writes happen on a background thread; see variants_project/log_handlers.py
+            'class': 'variants_project.log_handlers.QueuedFileHandler',
             'filename': str(LOG_FILE_PATH),
-            'formatter': 'verbose',
+            'formatter': 'json',
         },
         'console': {
             'level': 'INFO',
@@ -300,9 +322,6 @@ if CACHE_BACKEND == 'redis':
         'default': {
             'BACKEND': 'django.core.cache.backends.redis.RedisCache',
             'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1'),
-            'OPTIONS': {
-                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
-            }
         }
     }
 else:
@@ -314,6 +333,31 @@ else:
         }
     }
 
+# Seconds a computed /variants/statistics/ payload is served from cache.
+# Writes to variants, clinical significance or drug responses invalidate it early.
+STATISTICS_CACHE_TIMEOUT = int(os.getenv('STATISTICS_CACHE_TIMEOUT', '30'))
+
+# Seconds a paginated list's total row count is reused across page requests
+PAGINATION_COUNT_CACHE_TIMEOUT = int(os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', '30'))
+
+# Seconds a Gemini response, trend analysis or generated graph set is reused for identical input
+GEMINI_CACHE_TIMEOUT = int(os.getenv('GEMINI_CACHE_TIMEOUT', '3600'))
+
+# Seconds an OpenAI trend analysis is reused for an identical data summary
+LLM_ANALYSIS_CACHE_TIMEOUT = int(os.getenv('LLM_ANALYSIS_CACHE_TIMEOUT', '3600'))
+
+# Seconds a full trend prediction is reused while no new variant has been added
+LLM_PREDICTION_CACHE_TIMEOUT = int(os.getenv('LLM_PREDICTION_CACHE_TIMEOUT', '60'))
+
+# Seconds the SQS job tasks reuse the set of annotation source names and Galaxy
+# instance ids. Saving or deleting either model invalidates it early.
+TASK_LOOKUP_CACHE_TIMEOUT = int(os.getenv('TASK_LOOKUP_CACHE_TIMEOUT', '300'))
+
+# Seconds annotation jobs received by process_annotation_jobs_parallel stay
+# hidden on the queue. Covers the per-job tasks' wait in the broker plus their
+# run; a task not started by then expires, as its message is visible again.
+ANNOTATION_FANOUT_VISIBILITY_TIMEOUT = int(os.getenv('ANNOTATION_FANOUT_VISIBILITY_TIMEOUT', '900'))
+
 # =============================================================================
 # AWS CONFIGURATION
 # =============================================================================
@@ -1,11 +1,16 @@
-import json
 import logging
 from datetime import datetime
+import orjson
 from variants_project.aws_config import aws_config
 
 logger = logging.getLogger(__name__)
 
 
+def _dumps(data):
+    """Serialize a message body to the str SQS expects, encoding once in C"""
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
 class SQSJobHandler:
     """Handles SQS message processing for background jobs"""
     
@@ -13,26 +18,35 @@ class SQSJobHandler:
     SYNC_QUEUE = 'moffitt-sync-jobs'
     UPLOAD_QUEUE = 'moffitt-upload-jobs'
     
+    @staticmethod
+    def _annotation_job_message(variant_ids, sources, job_id):
+        """Body and attributes of an annotation job message"""
+        message_body = _dumps({
+            'job_type': 'annotation',
+            'job_id': str(job_id),
+            'variant_ids': variant_ids,
+            'sources': sources,
+            'timestamp': datetime.now().isoformat()
+        })
+        message_attributes = {
+            'job_id': {'StringValue': str(job_id), 'DataType': 'String'},
+            'source_count': {'StringValue': str(len(sources)), 'DataType': 'Number'},
+            'variant_count': {'StringValue': str(len(variant_ids)), 'DataType': 'Number'}
+        }
+        return message_body, message_attributes
+    
     @staticmethod
     def send_annotation_job(variant_ids, sources, job_id):
         """Queue annotation job to SQS"""
         try:
-            message_body = json.dumps({
-                'job_type': 'annotation',
-                'job_id': str(job_id),
-                'variant_ids': variant_ids,
-                'sources': sources,
-                'timestamp': datetime.now().isoformat()
-            })
+            message_body, message_attributes = SQSJobHandler._annotation_job_message(
+                variant_ids, sources, job_id
+            )
             
             success, result = aws_config.send_sqs_message(
                 SQSJobHandler.ANNOTATION_QUEUE,
                 message_body,
-                message_attributes={
-                    'job_id': {'StringValue': str(job_id), 'DataType': 'String'},
-                    'source_count': {'StringValue': str(len(sources)), 'DataType': 'Number'},
-                    'variant_count': {'StringValue': str(len(variant_ids)), 'DataType': 'Number'}
-                }
+                message_attributes=message_attributes
             )
             
             if success:
@@ -46,11 +60,47 @@ class SQSJobHandler:
             logger.error(f"Error sending annotation job: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    @staticmethod
+    def send_annotation_jobs_bulk(jobs):
+        """
+        Queue many annotation jobs to SQS, ten per request.
+        
+        jobs is a list of dicts with variant_ids, sources and job_id keys.
+        The result lists the message id of each queued job and, keyed by
+        job_id, the error for each job that couldn't be queued.
+        """
+        try:
+            messages = [
+                SQSJobHandler._annotation_job_message(job['variant_ids'], job['sources'], job['job_id'])
+                for job in jobs
+            ]
+            
+            message_ids, errors = aws_config.send_sqs_messages_batch(
+                SQSJobHandler.ANNOTATION_QUEUE,
+                messages
+            )
+            
+            queued = {
+                str(job['job_id']): message_id
+                for job, message_id in zip(jobs, message_ids)
+                if message_id is not None
+            }
+            failed = {str(jobs[i]['job_id']): error for i, error in errors.items()}
+            
+            logger.info(f"Annotation jobs queued: {len(queued)} of {len(jobs)}")
+            if failed:
+                logger.error(f"Failed to queue {len(failed)} annotation jobs")
+            return {'success': not failed, 'message_ids': queued, 'errors': failed}
+                
+        except Exception as e:
+            logger.error(f"Error sending annotation jobs: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
     @staticmethod
     def send_sync_job(galaxy_instance_id, job_type, items=None):
         """Queue Galaxy sync job to SQS"""
         try:
-            message_body = json.dumps({
+            message_body = _dumps({
                 'job_type': 'sync',
                 'galaxy_instance_id': galaxy_instance_id,
                 'sync_type': job_type,
@@ -83,7 +133,7 @@ class SQSJobHandler:
     def send_upload_job(s3_key, filename, file_size, metadata=None):
         """Queue file upload job to SQS"""
         try:
-            message_body = json.dumps({
+            message_body = _dumps({
                 'job_type': 'upload',
                 's3_key': s3_key,
                 'filename': filename,
@@ -114,24 +164,25 @@ class SQSJobHandler:
             return {'success': False, 'error': str(e)}
     
     @staticmethod
-    def receive_annotation_jobs(max_messages=5):
-        """Receive annotation jobs from SQS"""
+    def receive_annotation_jobs(max_messages=5, visibility_timeout=None):
+        """Receive annotation jobs from SQS; visibility_timeout overrides the queue's default"""
         try:
             messages = aws_config.receive_sqs_messages(
                 SQSJobHandler.ANNOTATION_QUEUE,
-                max_messages=max_messages
+                max_messages=max_messages,
+                visibility_timeout=visibility_timeout
             )
             
             jobs = []
             for msg in messages:
                 try:
-                    body = json.loads(msg['Body'])
+                    body = orjson.loads(msg['Body'])
                     jobs.append({
                         'message_id': msg['MessageId'],
                         'receipt_handle': msg['ReceiptHandle'],
                         'body': body
                     })
-                except json.JSONDecodeError:
+                except orjson.JSONDecodeError:
                     logger.error(f"Failed to parse message: {msg['MessageId']}")
             
             return {'success': True, 'jobs': jobs}
@@ -151,13 +202,13 @@ class SQSJobHandler:
             jobs = []
             for msg in messages:
                 try:
-                    body = json.loads(msg['Body'])
+                    body = orjson.loads(msg['Body'])
                     jobs.append({
                         'message_id': msg['MessageId'],
                         'receipt_handle': msg['ReceiptHandle'],
                         'body': body
                     })
-                except json.JSONDecodeError:
+                except orjson.JSONDecodeError:
                     logger.error(f"Failed to parse message: {msg['MessageId']}")
             
             return {'success': True, 'jobs': jobs}
@@ -165,17 +216,52 @@ class SQSJobHandler:
             logger.error(f"Error receiving sync jobs: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    @staticmethod
+    def receive_upload_jobs(max_messages=5):
+        """Receive upload jobs from SQS"""
+        try:
+            messages = aws_config.receive_sqs_messages(
+                SQSJobHandler.UPLOAD_QUEUE,
+                max_messages=max_messages
+            )
+            
+            jobs = []
+            for msg in messages:
+                try:
+                    body = orjson.loads(msg['Body'])
+                    jobs.append({
+                        'message_id': msg['MessageId'],
+                        'receipt_handle': msg['ReceiptHandle'],
+                        'body': body
+                    })
+                except orjson.JSONDecodeError:
+                    logger.error(f"Failed to parse message: {msg['MessageId']}")
+            
+            return {'success': True, 'jobs': jobs}
+        except Exception as e:
+            logger.error(f"Error receiving upload jobs: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
     @staticmethod
     def acknowledge_job(queue_name, receipt_handle):
         """Remove job from queue after processing"""
+        result = SQSJobHandler.acknowledge_jobs(queue_name, [receipt_handle])
+        if result['success']:
+            return {'success': True}
+        return {'success': False, 'error': result.get('error', 'Failed to acknowledge job')}
+    
+    @staticmethod
+    def acknowledge_jobs(queue_name, receipt_handles):
+        """Remove processed jobs from queue, ten per DeleteMessageBatch call"""
         try:
-            success = aws_config.delete_sqs_message(queue_name, receipt_handle)
-            if success:
-                logger.info(f"Job acknowledged and removed from queue")
-                return {'success': True}
-            return {'success': False, 'error': 'Failed to acknowledge job'}
+            failed = aws_config.delete_sqs_messages_batch_failed(queue_name, list(receipt_handles))
+            acknowledged = len(receipt_handles) - len(failed)
+            logger.info(f"Jobs acknowledged and removed from queue: {acknowledged}")
+            if failed:
+                logger.error(f"Failed to acknowledge {len(failed)} jobs")
+            return {'success': not failed, 'acknowledged': acknowledged, 'failed': len(failed)}
         except Exception as e:
-            logger.error(f"Error acknowledging job: {str(e)}")
+            logger.error(f"Error acknowledging jobs: {str(e)}")
             return {'success': False, 'error': str(e)}
     
     @staticmethod
@@ -1,11 +1,17 @@
-import json
 import logging
-from typing import Dict, Any, Optional, List
+from functools import cached_property
+from typing import Dict, Any, Optional, List, Tuple
+import orjson
 from .aws_config import aws_config
 
 logger = logging.getLogger(__name__)
 
 
+def _dumps(data: Any) -> str:
+    """Serialize a message body to the str SQS expects, encoding once in C"""
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
 class SQSMessageHandler:
     """Handle SQS messaging for async job processing"""
     
@@ -23,31 +29,119 @@ class SQSMessageHandler:
             (success, message_id or error_message)
         """
         try:
-            message_body = {
-                'variant_id': variant_id,
-                'annotation_source': annotation_source,
-                'job_config': job_config,
-                'action': 'annotate'
-            }
+            message_body, message_attributes = SQSMessageHandler._annotation_message(
+                variant_id, annotation_source, job_config
+            )
             
             return aws_config.send_sqs_message(
                 aws_config.sqs_annotation_queue,
-                json.dumps(message_body),
-                message_attributes={
-                    'VariantId': {
-                        'StringValue': str(variant_id),
-                        'DataType': 'String'
-                    },
-                    'Source': {
-                        'StringValue': annotation_source,
-                        'DataType': 'String'
-                    }
-                }
+                message_body,
+                message_attributes=message_attributes
             )
         except Exception as e:
             logger.error(f"Failed to send annotation job: {str(e)}")
             return False, str(e)
     
+    @staticmethod
+    def send_annotation_jobs_batch(jobs: List[Tuple[int, str, Dict[str, Any]]]) -> List[tuple]:
+        """
+        Send many annotation jobs to SQS queue, ten per SendMessageBatch call
+        
+        Args:
+            jobs: (variant_id, annotation_source, job_config) tuples
+            
+        Returns:
+            (success, message_id or error_message) for each job, in order
+        """
+        try:
+            messages = [SQSMessageHandler._annotation_message(*job) for job in jobs]
+            return SQSMessageHandler._send_annotation_messages(messages)
+        except Exception as e:
+            logger.error(f"Failed to send annotation jobs: {str(e)}")
+            return [(False, str(e))] * len(jobs)
+    
+    @staticmethod
+    def send_variant_annotation_jobs(variant_ids: List[int], annotation_source: str,
+                                     job_config: Dict[str, Any]) -> List[tuple]:
+        """
+        Send one annotation job per variant, all with the same source and config
+        
+        The shared part of the body is serialized once and each variant id
+        spliced into it, so job_config isn't re-encoded for every message.
+        
+        Args:
+            variant_ids: IDs of the variants to annotate
+            annotation_source: Source of annotation (ClinVar, COSMIC, CIViC)
+            job_config: Additional job configuration
+            
+        Returns:
+            (success, message_id or error_message) for each variant, in order
+        """
+        try:
+            template = SQSMessageHandler.prepare_annotation_template(annotation_source, job_config)
+            messages = [
+                SQSMessageHandler._annotation_message(variant_id, annotation_source, template=template)
+                for variant_id in variant_ids
+            ]
+            return SQSMessageHandler._send_annotation_messages(messages)
+        except Exception as e:
+            logger.error(f"Failed to send annotation jobs: {str(e)}")
+            return [(False, str(e))] * len(variant_ids)
+    
+    @staticmethod
+    def prepare_annotation_template(annotation_source: str, job_config: Dict[str, Any]) -> bytes:
+        """
+        Serialize the variant-independent part of an annotation job body
+        
+        Returns the JSON object without its closing brace, ready for a
+        variant id to be appended by _annotation_message.
+        """
+        return orjson.dumps({
+            'annotation_source': annotation_source,
+            'job_config': job_config,
+            'action': 'annotate'
+        }, option=orjson.OPT_NON_STR_KEYS)[:-1]
+    
+    @staticmethod
+    def _send_annotation_messages(messages: List[tuple]) -> List[tuple]:
+        """Send prepared annotation messages in batches and pair each with its outcome"""
+        message_ids, errors = aws_config.send_sqs_messages_batch(
+            aws_config.sqs_annotation_queue,
+            messages
+        )
+        
+        if errors:
+            logger.error(f"Failed to send {len(errors)} of {len(messages)} annotation jobs")
+        return [
+            (False, errors[index]) if index in errors else (True, message_id)
+            for index, message_id in enumerate(message_ids)
+        ]
+    
+    @staticmethod
+    def _annotation_message(variant_id: int, annotation_source: str, job_config: Optional[Dict[str, Any]] = None,
+                            template: Optional[bytes] = None) -> tuple:
+        """Body and attributes of an annotation job message, from job_config or a prepared template"""
+        if template is None:
+            message_body = _dumps({
+                'variant_id': variant_id,
+                'annotation_source': annotation_source,
+                'job_config': job_config,
+                'action': 'annotate'
+            })
+        else:
+            message_body = (template + b',"variant_id":' + orjson.dumps(variant_id) + b'}').decode()
+        message_attributes = {
+            'VariantId': {
+                'StringValue': str(variant_id),
+                'DataType': 'String'
+            },
+            'Source': {
+                'StringValue': annotation_source,
+                'DataType': 'String'
+            }
+        }
+        return message_body, message_attributes
+    
     @staticmethod
     def send_sync_job(galaxy_instance_id: int, job_type: str, job_config: Dict[str, Any]) -> tuple:
         """
@@ -71,7 +165,7 @@ class SQSMessageHandler:
             
             return aws_config.send_sqs_message(
                 aws_config.sqs_sync_queue,
-                json.dumps(message_body),
+                _dumps(message_body),
                 message_attributes={
                     'GalaxyInstanceId': {
                         'StringValue': str(galaxy_instance_id),
@@ -110,7 +204,7 @@ class SQSMessageHandler:
             
             return aws_config.send_sqs_message(
                 'moffitt-upload-jobs',
-                json.dumps(message_body),
+                _dumps(message_body),
                 message_attributes={
                     'FileName': {
                         'StringValue': file_name,
@@ -127,19 +221,27 @@ class SQSMessageHandler:
             return False, str(e)
     
     @staticmethod
-    def receive_messages(queue_name: str, max_messages: int = 10) -> List[Dict[str, Any]]:
+    def receive_messages(queue_name: str, max_messages: int = 10, wait_seconds: int = 20,
+                         visibility_timeout: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Receive messages from SQS queue
         
         Args:
             queue_name: Name of the queue
-            max_messages: Maximum number of messages to receive
+            max_messages: Maximum number of messages to receive (SQS caps this at 10)
+            wait_seconds: How long to long-poll an empty queue before returning
+            visibility_timeout: Seconds to hide received messages, or None for the queue default
             
         Returns:
             List of messages
         """
         try:
-            messages = aws_config.receive_sqs_messages(queue_name, max_messages)
+            messages = aws_config.receive_sqs_messages(
+                queue_name,
+                max_messages=max_messages,
+                wait_time=wait_seconds,
+                visibility_timeout=visibility_timeout
+            )
             return messages
         except Exception as e:
             logger.error(f"Failed to receive messages: {str(e)}")
@@ -163,6 +265,26 @@ class SQSMessageHandler:
             logger.error(f"Failed to delete message: {str(e)}")
             return False
     
+    @staticmethod
+    def delete_messages(queue_name: str, receipt_handles: List[str]) -> bool:
+        """
+        Delete several messages from SQS queue in batched calls
+        
+        Args:
+            queue_name: Name of the queue
+            receipt_handles: Receipt handles of the messages to delete
+            
+        Returns:
+            Success status
+        """
+        if not receipt_handles:
+            return True
+        try:
+            return aws_config.delete_sqs_messages_batch(queue_name, receipt_handles)
+        except Exception as e:
+            logger.error(f"Failed to delete messages: {str(e)}")
+            return False
+    
     @staticmethod
     def create_queues() -> Dict[str, bool]:
         """
@@ -197,9 +319,13 @@ class QueueMessage:
         self.message = message
         self.message_id = message.get('MessageId')
         self.receipt_handle = message.get('ReceiptHandle')
-        self.body = json.loads(message.get('Body', '{}'))
         self.attributes = message.get('MessageAttributes', {})
     
+    @cached_property
+    def body(self) -> Dict[str, Any]:
+        """Message body, parsed on first access so ack-only callers skip the decode"""
+        return orjson.loads(self.message.get('Body', '{}'))
+    
     def get_variant_id(self) -> Optional[int]:
         """Get variant ID from message"""
         return self.body.get('variant_id')
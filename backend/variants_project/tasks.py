@@ -1,184 +1,309 @@
 import json
 import logging
-from datetime import datetime
-from celery import shared_task
+from celery import group, shared_task
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
 from variants_project.sqs_handlers import sqs_handler
 from variants_project.s3_storage import s3_storage
 from annotations.models import AnnotationJob, AnnotationSource
+from annotations.signals import ANNOTATION_SOURCE_NAMES_CACHE_KEY
 from galaxy_integration.models import GalaxySyncJob, GalaxyInstance
+from galaxy_integration.signals import GALAXY_INSTANCE_IDS_CACHE_KEY
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task(bind=True, max_retries=3)
+def _annotation_source_names():
+    """Names of all annotation sources, cached across task runs"""
+    return cache.get_or_set(
+        ANNOTATION_SOURCE_NAMES_CACHE_KEY,
+        lambda: frozenset(AnnotationSource.objects.values_list('name', flat=True)),
+        settings.TASK_LOOKUP_CACHE_TIMEOUT
+    )
+
+
+def _as_pk(value):
+    """A message's id field as an int primary key, or None if it isn't one"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _galaxy_instance_ids():
+    """Ids of all Galaxy instances, cached across task runs"""
+    return cache.get_or_set(
+        GALAXY_INSTANCE_IDS_CACHE_KEY,
+        lambda: frozenset(GalaxyInstance.objects.values_list('id', flat=True)),
+        settings.TASK_LOOKUP_CACHE_TIMEOUT
+    )
+
+
+# Per-message log calls below pass their arguments to the logger instead of
+# using f-strings, so nothing is formatted when INFO is filtered out
+def handle_annotation_jobs(jobs):
+    """Process a batch of received annotation jobs and acknowledge the ones handled"""
+    processed = 0
+    failed = 0
+    receipt_handles = []
+    # One clock read for the whole batch
+    now = timezone.now()
+    
+    # Look up every job the batch mentions in one query; source names come from cache
+    bodies = [job['body'] for job in jobs if isinstance(job['body'], dict)]
+    # Only the columns this handler reads or bulk_updates
+    annotation_jobs = AnnotationJob.objects.only(
+        'id', 'job_id', 'status', 'started_at', 'completed_at', 'processed_count'
+    ).in_bulk(
+        # job_id is a CharField but messages may carry it as a number
+        {str(body['job_id']) for body in bodies if body.get('job_id') is not None},
+        field_name='job_id'
+    )
+    annotation_sources = _annotation_source_names()
+    # Finished jobs, keyed by pk, saved together once the batch is done
+    completed_jobs = {}
+    
+    for job in jobs:
+        try:
+            body = job['body']
+            job_id = body.get('job_id')
+            variant_ids = body.get('variant_ids', [])
+            sources = body.get('sources', [])
+            
+            logger.info("Processing annotation job %s: %d variants, %d sources", job_id, len(variant_ids), len(sources))
+            
+            annotation_job = annotation_jobs.get(str(job_id)) if job_id is not None else None
+            if annotation_job is None:
+                logger.warning("Annotation job %s not found in database", job_id)
+            
+            for source_name in sources:
+                if source_name in annotation_sources:
+                    logger.info("Annotating %d variants with %s", len(variant_ids), source_name)
+                    
+                    if annotation_job:
+                        annotation_job.started_at = now
+                else:
+                    logger.warning("Annotation source %s not found", source_name)
+            
+            receipt_handles.append(job['receipt_handle'])
+            processed += 1
+            
+            if annotation_job:
+                annotation_job.status = 'completed'
+                annotation_job.completed_at = now
+                annotation_job.processed_count = len(variant_ids)
+                completed_jobs[annotation_job.pk] = annotation_job
+                
+        except Exception as e:
+            logger.error(f"Error processing annotation job: {str(e)}")
+            failed += 1
+    
+    # Saved before acking, so a failed save leaves the messages to be redelivered
+    if completed_jobs:
+        AnnotationJob.objects.bulk_update(
+            completed_jobs.values(),
+            ['status', 'started_at', 'completed_at', 'processed_count']
+        )
+    
+    if receipt_handles:
+        sqs_handler.acknowledge_jobs('moffitt-annotation-jobs', receipt_handles)
+    
+    return {
+        'success': True,
+        'processed': processed,
+        'failed': failed,
+        'timestamp': timezone.now().isoformat()
+    }
+
+
+@shared_task(bind=True, max_retries=3, acks_late=True, reject_on_worker_lost=True)
 def process_annotation_jobs(self):
     """Process annotation jobs from SQS queue"""
     try:
-        result = sqs_handler.receive_annotation_jobs(max_messages=5)
+        result = sqs_handler.receive_annotation_jobs(max_messages=10)
         
         if not result['success']:
             logger.error(f"Failed to receive annotation jobs: {result['error']}")
             return {'success': False, 'error': result['error']}
         
-        jobs = result['jobs']
-        processed = 0
-        failed = 0
+        return handle_annotation_jobs(result['jobs'])
         
-        for job in jobs:
-            try:
-                body = job['body']
-                job_id = body.get('job_id')
-                variant_ids = body.get('variant_ids', [])
-                sources = body.get('sources', [])
-                
-                logger.info(f"Processing annotation job {job_id}: {len(variant_ids)} variants, {len(sources)} sources")
-                
-                try:
-                    annotation_job = AnnotationJob.objects.get(job_id=job_id)
-                except AnnotationJob.DoesNotExist:
-                    logger.warning(f"Annotation job {job_id} not found in database")
-                    annotation_job = None
-                
-                for source_name in sources:
-                    try:
-                        source = AnnotationSource.objects.get(name=source_name)
-                        logger.info(f"Annotating {len(variant_ids)} variants with {source_name}")
-                        
-                        if annotation_job:
-                            annotation_job.status = 'running'
-                            annotation_job.started_at = datetime.now()
-                            annotation_job.save()
-                    except AnnotationSource.DoesNotExist:
-                        logger.warning(f"Annotation source {source_name} not found")
-                
-                sqs_handler.acknowledge_job('moffitt-annotation-jobs', job['receipt_handle'])
-                processed += 1
-                
-                if annotation_job:
-                    annotation_job.status = 'completed'
-                    annotation_job.completed_at = datetime.now()
-                    annotation_job.processed_count = len(variant_ids)
-                    annotation_job.save()
-                    
-            except Exception as e:
-                logger.error(f"Error processing annotation job: {str(e)}")
-                failed += 1
+    except Exception as e:
+        logger.error(f"Fatal error in process_annotation_jobs: {str(e)}")
+        self.retry(exc=e, countdown=60)
+
+
+@shared_task(bind=True, max_retries=3, acks_late=True, reject_on_worker_lost=True)
+def process_annotation_jobs_parallel(self):
+    """
+    Receive annotation jobs from SQS and process each in its own task.
+    
+    A slow job no longer holds up the rest of its batch: the jobs run
+    concurrently across workers, and each acknowledges its own message.
+    The messages are received with ANNOTATION_FANOUT_VISIBILITY_TIMEOUT, and
+    a task still queued when that runs out expires instead of running, since
+    its message will have been redelivered and its receipt handle is stale.
+    """
+    visibility_timeout = settings.ANNOTATION_FANOUT_VISIBILITY_TIMEOUT
+    try:
+        result = sqs_handler.receive_annotation_jobs(
+            max_messages=10,
+            visibility_timeout=visibility_timeout
+        )
+        
+        if not result['success']:
+            logger.error(f"Failed to receive annotation jobs: {result['error']}")
+            return {'success': False, 'error': result['error']}
+        
+        jobs = result['jobs']
+        if jobs:
+            group(
+                process_single_annotation_job.s(job).set(expires=visibility_timeout)
+                for job in jobs
+            ).apply_async()
         
         return {
             'success': True,
-            'processed': processed,
-            'failed': failed,
-            'timestamp': datetime.now().isoformat()
+            'dispatched': len(jobs),
+            'timestamp': timezone.now().isoformat()
         }
         
     except Exception as e:
-        logger.error(f"Fatal error in process_annotation_jobs: {str(e)}")
+        logger.error(f"Fatal error in process_annotation_jobs_parallel: {str(e)}")
         self.retry(exc=e, countdown=60)
 
 
-@shared_task(bind=True, max_retries=3)
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def process_single_annotation_job(job):
+    """Process and acknowledge one received annotation job"""
+    return handle_annotation_jobs([job])
+
+
+def handle_sync_jobs(jobs):
+    """
+    Process a batch of received Galaxy sync jobs and acknowledge the ones handled.
+    
+    A job whose Galaxy instance doesn't exist, or whose sync job row can't
+    be created, counts as failed and stays on the queue.
+    """
+    processed = 0
+    failed = 0
+    receipt_handles = []
+    # One clock read for the whole batch
+    now = timezone.now()
+    
+    galaxy_instance_ids = _galaxy_instance_ids()
+    
+    for job in jobs:
+        try:
+            body = job['body']
+            sync_type = body.get('sync_type')
+            items = body.get('items', [])
+            
+            logger.info("Processing sync job: %s for Galaxy instance %s", sync_type, body.get('galaxy_instance_id'))
+            
+            # Ids posted as form data arrive as strings; the cached ids are ints
+            galaxy_instance_id = _as_pk(body.get('galaxy_instance_id'))
+            if galaxy_instance_id not in galaxy_instance_ids:
+                # GalaxySyncJob.galaxy_instance is required, so there is no row to create
+                logger.warning("Galaxy instance %s not found", body.get('galaxy_instance_id'))
+                failed += 1
+                continue
+            
+            sync_job = GalaxySyncJob.objects.create(
+                galaxy_instance_id=galaxy_instance_id,
+                job_type=sync_type,
+                status='running',
+                started_at=now,
+                items_total=len(items)
+            )
+            
+            logger.info("Created sync job %s for %s", sync_job.id, sync_type)
+            
+            sync_job.items_processed = len(items)
+            sync_job.status = 'completed'
+            sync_job.completed_at = now
+            sync_job.save()
+            
+            receipt_handles.append(job['receipt_handle'])
+            processed += 1
+            
+        except Exception as e:
+            logger.error(f"Error processing sync job: {str(e)}")
+            failed += 1
+    
+    if receipt_handles:
+        sqs_handler.acknowledge_jobs('moffitt-sync-jobs', receipt_handles)
+    
+    return {
+        'success': True,
+        'processed': processed,
+        'failed': failed,
+        'timestamp': timezone.now().isoformat()
+    }
+
+
+@shared_task(bind=True, max_retries=3, acks_late=True, reject_on_worker_lost=True)
 def process_sync_jobs(self):
     """Process Galaxy sync jobs from SQS queue"""
     try:
-        result = sqs_handler.receive_sync_jobs(max_messages=5)
+        result = sqs_handler.receive_sync_jobs(max_messages=10)
         
         if not result['success']:
             logger.error(f"Failed to receive sync jobs: {result['error']}")
             return {'success': False, 'error': result['error']}
         
-        jobs = result['jobs']
-        processed = 0
-        failed = 0
-        
-        for job in jobs:
-            try:
-                body = job['body']
-                galaxy_instance_id = body.get('galaxy_instance_id')
-                sync_type = body.get('sync_type')
-                items = body.get('items', [])
-                
-                logger.info(f"Processing sync job: {sync_type} for Galaxy instance {galaxy_instance_id}")
-                
-                try:
-                    galaxy_instance = GalaxyInstance.objects.get(id=galaxy_instance_id)
-                except GalaxyInstance.DoesNotExist:
-                    logger.warning(f"Galaxy instance {galaxy_instance_id} not found")
-                    galaxy_instance = None
-                
-                try:
-                    sync_job = GalaxySyncJob.objects.create(
-                        galaxy_instance=galaxy_instance,
-                        job_type=sync_type,
-                        status='running',
-                        started_at=datetime.now(),
-                        items_total=len(items)
-                    )
-                    
-                    logger.info(f"Created sync job {sync_job.id} for {sync_type}")
-                    
-                    sync_job.items_processed = len(items)
-                    sync_job.status = 'completed'
-                    sync_job.completed_at = datetime.now()
-                    sync_job.save()
-                    
-                except Exception as e:
-                    logger.error(f"Error creating sync job: {str(e)}")
-                
-                sqs_handler.acknowledge_job('moffitt-sync-jobs', job['receipt_handle'])
-                processed += 1
-                
-            except Exception as e:
-                logger.error(f"Error processing sync job: {str(e)}")
-                failed += 1
-        
-        return {
-            'success': True,
-            'processed': processed,
-            'failed': failed,
-            'timestamp': datetime.now().isoformat()
-        }
+        return handle_sync_jobs(result['jobs'])
         
     except Exception as e:
         logger.error(f"Fatal error in process_sync_jobs: {str(e)}")
         self.retry(exc=e, countdown=60)
 
 
-@shared_task(bind=True, max_retries=3)
+def handle_upload_jobs(jobs):
+    """Process a batch of received upload jobs and acknowledge the ones handled"""
+    processed = 0
+    failed = 0
+    receipt_handles = []
+    
+    for job in jobs:
+        try:
+            body = job['body']
+            s3_key = body.get('s3_key')
+            filename = body.get('filename')
+            
+            logger.info("Processing upload job: %s", filename)
+            
+            receipt_handles.append(job['receipt_handle'])
+            processed += 1
+            
+        except Exception as e:
+            logger.error(f"Error processing upload job: {str(e)}")
+            failed += 1
+    
+    if receipt_handles:
+        sqs_handler.acknowledge_jobs('moffitt-upload-jobs', receipt_handles)
+    
+    return {
+        'success': True,
+        'processed': processed,
+        'failed': failed,
+        'timestamp': timezone.now().isoformat()
+    }
+
+
+@shared_task(bind=True, max_retries=3, acks_late=True, reject_on_worker_lost=True)
 def process_upload_jobs(self):
     """Process file upload jobs from SQS queue"""
     try:
-        result = sqs_handler.receive_annotation_jobs(max_messages=5)
+        result = sqs_handler.receive_upload_jobs(max_messages=10)
         
         if not result['success']:
             logger.error(f"Failed to receive upload jobs: {result['error']}")
             return {'success': False, 'error': result['error']}
         
-        jobs = result['jobs']
-        processed = 0
-        failed = 0
-        
-        for job in jobs:
-            try:
-                body = job['body']
-                s3_key = body.get('s3_key')
-                filename = body.get('filename')
-                
-                logger.info(f"Processing upload job: {filename}")
-                
-                sqs_handler.acknowledge_job('moffitt-upload-jobs', job['receipt_handle'])
-                processed += 1
-                
-            except Exception as e:
-                logger.error(f"Error processing upload job: {str(e)}")
-                failed += 1
-        
-        return {
-            'success': True,
-            'processed': processed,
-            'failed': failed,
-            'timestamp': datetime.now().isoformat()
-        }
+        return handle_upload_jobs(result['jobs'])
         
     except Exception as e:
         logger.error(f"Fatal error in process_upload_jobs: {str(e)}")
@@ -20,17 +20,21 @@ router.register(r'aws/files', aws_views.AWSFileUploadViewSet, basename='aws-file
 router.register(r'aws/annotation-jobs', aws_views.AWSAnnotationJobViewSet, basename='aws-annotation-jobs')
 router.register(r'aws/sync-jobs', aws_views.AWSSyncJobViewSet, basename='aws-sync-jobs')
 
+# Explicit routes come before the router: its variants/<pk>/ pattern would
+# otherwise capture paths such as variants/chat/ as a primary key, and each
+# request here would first be tried against every router pattern.
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', include(router.urls)),
     path('api/variants/natural_language_search/', gemini_views.NaturalLanguageSearchView.as_view()),
     path('api/variants/chat/', gemini_views.VariantChatView.as_view()),
+    path('api/variants/chat/stream/', gemini_views.VariantChatStreamView.as_view()),
     path('api/variants/debug-statistics/', debug_statistics, name='debug-statistics'),
     path('api/ai/trend-prediction/', ai_views.TrendPredictionView.as_view(), name='trend-prediction'),
     path('api/ai/generate-graph/', ai_views.GraphGenerationView.as_view(), name='generate-graph'),
     path('api/ai/variant-statistics-graph/', ai_views.VariantStatisticsGraphView.as_view(), name='variant-statistics-graph'),
+    path('api/aws/health/', aws_health_check, name='aws-health-check'),
+    path('api/', include(router.urls)),
     path('api/galaxy/', include('galaxy_integration.urls')),
     path('api/annotations/', include('annotations.urls')),
-    path('api/aws/health/', aws_health_check, name='aws-health-check'),
 ]
 
@@ -1,6 +1,9 @@
 import sqlite3
 
 conn = sqlite3.connect(r'c:\Users\2006t\Documents\Moffitt\backend\db.sqlite3')
+# Read-only inspection; let SQLite map the file instead of copying pages
+conn.execute("PRAGMA query_only=1")
+conn.execute("PRAGMA mmap_size=268435456")
 cursor = conn.cursor()
 
 # Get all tables
@@ -10,17 +13,15 @@ print("Available tables:")
 for table in tables:
     print(f"  - {table[0]}")
 
-# Count records
-cursor.execute("SELECT COUNT(*) FROM variants_variant")
-variants = cursor.fetchone()[0]
+# Count records in a single statement
+cursor.execute(
+    "SELECT (SELECT COUNT(*) FROM variants_variant), "
+    "(SELECT COUNT(*) FROM variants_clinicalsignificance), "
+    "(SELECT COUNT(*) FROM variants_drugresponse)"
+)
+variants, clinical, drugs = cursor.fetchone()
 print(f"\nTotal Variants: {variants}")
-
-cursor.execute("SELECT COUNT(*) FROM variants_clinicalsignificance")
-clinical = cursor.fetchone()[0]
 print(f"Clinical Significance Records: {clinical}")
-
-cursor.execute("SELECT COUNT(*) FROM variants_drugresponse")
-drugs = cursor.fetchone()[0]
 print(f"Drug Response Records: {drugs}")
 
 conn.close()
\ No newline at end of file